@@ -0,0 +1,49 @@
+import os
+import stat
+
+import anyio
+from fastapi.responses import FileResponse
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+# ----------------------------------------
+# File Responses
+# ----------------------------------------
+
+PATHSEND = "http.response.pathsend"
+
+
+class PathSendFileResponse(FileResponse):
+    """
+    A FileResponse that hands the file to the server with the ASGI path-send
+    extension when the server offers it (e.g. Granian), so the server can
+    `sendfile` it instead of reading it through Python in chunks.
+
+    Range and HEAD requests, and servers without the extension (e.g. Uvicorn),
+    get the regular FileResponse behaviour.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+                PATHSEND not in scope.get("extensions", {})
+                or scope["method"].upper() == "HEAD"
+                or "range" in Headers(scope=scope)
+        ):
+            await super().__call__(scope, receive, send)
+            return
+
+        if self.stat_result is None:
+            try:
+                stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            if not stat.S_ISREG(stat_result.st_mode):
+                raise RuntimeError(f"File at path {self.path} is not a file.")
+            self.set_stat_headers(stat_result)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        # The extension requires an absolute path
+        await send({"type": PATHSEND, "path": os.path.abspath(self.path)})
+
+        if self.background is not None:
+            await self.background()
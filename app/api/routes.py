@@ -1,66 +1,158 @@
-import shutil
-import uuid
-from pathlib import Path
-from typing import List
+import mimetypes
+from datetime import date, datetime
+from typing import List, Literal, Optional
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
+import anyio
+import orjson
+from fastapi import APIRouter, Depends, UploadFile, File, Header, HTTPException, Response
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.dependencies import get_db
+from app.api.responses import PathSendFileResponse
+from app.core.database import IS_SQLITE
+from app.core.dependencies import get_async_db
 from app.crud import (
-    create_receipt_and_items,
-    get_receipt_file,
-    create_receipt_file,
-    update_validation_status,
-    mark_as_processed,
-    get_all_receipts,
-    get_receipt,
+    aio,
+    encode_receipt_cursor,
+    decode_receipt_cursor,
+    receipt_filter_clauses,
 )
 from app.schemas import payloads, receipt
 from app.services import ocr_service
+from app.services.export_service import export_receipts
+from app.services.job_queue import JobStatus, QueueFullError, job_file_id
+from app.services.llm_cache import llm_cache
+from app.services.pipeline import (
+    AlreadyQueuedError,
+    job_queue,
+    reextract_queue,
+    submit_processing,
+    submit_reextract,
+)
+from app.services.receipt_cache import etag_matches, make_etag, receipt_cache
+from app.services.storage import CHUNK_SIZE, is_compressed, open_stored
+from app.services.upload_service import ingest_batch_async, store_upload_async
 from utils.logging import log
 
 logger = log(__name__)
 
-# ----------------------------------------
-# File Upload Configuration
-# ----------------------------------------
-
-UPLOADS_DIR = Path("uploads")
-UPLOADS_DIR.mkdir(exist_ok=True)  # Ensure the directory exists
-
 router = APIRouter()
 
+ReceiptSort = Literal["created_at", "-created_at", "purchased_at", "-purchased_at", "total_amount", "-total_amount"]
+
 
 # ----------------------------------------
 # Upload Receipt
 # ----------------------------------------
 
 @router.post("/upload", response_model=payloads.UploadResponse)
-def upload_receipt(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_receipt(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     """
     Uploads a receipt file (PDF only).
-    Saves the file and creates a metadata record in the database.
+    Saves the file under its SHA-256 and creates a metadata record in the database.
+    Re-uploading identical content returns the existing file and receipt instead.
     """
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are accepted.")
 
-    # Create a unique filename
-    file_extension = Path(file.filename).suffix
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = UPLOADS_DIR / unique_filename
+    # Save file to disk in chunks, hashing it as it streams
+    try:
+        db_file, is_duplicate = await store_upload_async(db, file, file.filename)
+    finally:
+        await file.close()
+
+    return {
+        "id": db_file.id,
+        "file_name": db_file.file_name,
+        "content_hash": db_file.content_hash,
+        "is_duplicate": is_duplicate,
+        "receipt_id": await aio.get_receipt_id_for_file(db, file_id=db_file.id) if is_duplicate else None,
+    }
 
-    # Save file to disk
+
+# ----------------------------------------
+# Batch Upload
+# ----------------------------------------
+
+@router.post("/upload/batch", response_model=payloads.BatchUploadResponse)
+async def upload_receipts_batch(
+        files: List[UploadFile] = File(...),
+        process: bool = False,
+):
+    """
+    Uploads many receipts in one request: any mix of PDFs and ZIP archives of PDFs.
+    Each PDF is stored, deduplicated and validated inline; with `process=true`,
+    valid files are also queued for processing.
+    Returns one result per PDF, in upload order.
+    """
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        results = await ingest_batch_async([(f.filename, f.content_type, f.file) for f in files], process=process)
     finally:
-        file.file.close()
+        for f in files:
+            await f.close()
+
+    return {"files": results}
+
+
+# ----------------------------------------
+# Download Receipt File
+# ----------------------------------------
+
+def _accepts_gzip(accept_encoding: str | None) -> bool:
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() == "gzip":
+            quality = params.strip().lower().removeprefix("q=")
+            try:
+                return float(quality or 1) > 0
+            except ValueError:
+                return True
+    return False
 
-    # Create DB record
-    db_file = create_receipt_file(db, file_name=file.filename, file_path=str(file_path))
-    logger.info(f"Uploaded file saved: {file.filename} -> {file_path}")
-    return {"id": db_file.id, "file_name": db_file.file_name}
+
+@router.get("/files/{file_id}/download", response_class=FileResponse)
+async def download_receipt_file(
+        file_id: int,
+        accept_encoding: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Downloads the original uploaded file. Files are sent straight from disk, with
+    `sendfile` on servers that support the ASGI path-send extension (e.g. Granian);
+    compressed files are sent as stored with `Content-Encoding: gzip` to clients
+    that accept it, and decompressed otherwise.
+    Returns 410 if the retention job has already deleted the file.
+    """
+    db_file = await aio.get_receipt_file(db, file_id=file_id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    if db_file.purged_at is not None:
+        raise HTTPException(status_code=410, detail="File was removed by the retention policy.")
+    if not await anyio.Path(db_file.file_path).exists():
+        raise HTTPException(status_code=404, detail="Stored file is missing.")
+
+    media_type = mimetypes.guess_type(db_file.file_name)[0] or "application/octet-stream"
+    if not is_compressed(db_file.file_path):
+        return PathSendFileResponse(db_file.file_path, media_type=media_type, filename=db_file.file_name)
+    if _accepts_gzip(accept_encoding):
+        return PathSendFileResponse(
+            db_file.file_path, media_type=media_type, filename=db_file.file_name,
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+
+    def chunks():
+        with open_stored(db_file.file_path) as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    return StreamingResponse(
+        chunks(), media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(db_file.file_name)}",
+            "Vary": "Accept-Encoding",
+        },
+    )
 
 
 # ----------------------------------------
@@ -68,17 +160,19 @@ def upload_receipt(file: UploadFile = File(...), db: Session = Depends(get_db)):
 # ----------------------------------------
 
 @router.post("/validate", response_model=payloads.ValidationResponse)
-def validate_receipt(request: payloads.ValidationRequest, db: Session = Depends(get_db)):
+async def validate_receipt(request: payloads.ValidationRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Validates if a receipt file is a proper PDF.
     Updates validation status in the DB.
     """
-    db_file = get_receipt_file(db, file_id=request.file_id)
+    db_file = await aio.get_receipt_file(db, file_id=request.file_id)
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
+    if db_file.purged_at is not None:
+        raise HTTPException(status_code=410, detail="File was removed by the retention policy.")
 
-    is_valid, reason = ocr_service.validate_pdf(db_file.file_path)
-    update_validation_status(db, file_id=request.file_id, is_valid=is_valid, reason=reason)
+    is_valid, reason = await ocr_service.validate_pdf_async(db_file.file_path)
+    await aio.update_validation_status(db, file_id=request.file_id, is_valid=is_valid, reason=reason)
 
     message = "File is a valid PDF." if is_valid else f"File is invalid: {reason}"
     logger.info(f"Validation result for file_id={request.file_id}: {message}")
@@ -90,13 +184,13 @@ def validate_receipt(request: payloads.ValidationRequest, db: Session = Depends(
 # Process Receipt with OCR/LLM
 # ----------------------------------------
 
-@router.post("/process", response_model=payloads.ProcessResponse)
-def process_receipt(request: payloads.ProcessRequest, db: Session = Depends(get_db)):
+@router.post("/process", response_model=payloads.ProcessResponse, status_code=202)
+async def process_receipt(request: payloads.ProcessRequest, db: AsyncSession = Depends(get_async_db)):
     """
-    Processes the receipt file using OCR and AI extraction.
-    Creates receipt + item records in the DB.
+    Queues the receipt file for OCR and AI extraction.
+    Returns a job ID immediately; poll /jobs/{job_id} for the result.
     """
-    db_file = get_receipt_file(db, file_id=request.file_id)
+    db_file = await aio.get_receipt_file(db, file_id=request.file_id)
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
     if db_file.is_valid is not True:
@@ -105,21 +199,149 @@ def process_receipt(request: payloads.ProcessRequest, db: Session = Depends(get_
         raise HTTPException(status_code=400, detail="File has already been processed.")
 
     try:
-        # OCR + LLM extraction
-        extracted_data = ocr_service.extract_data_from_receipt(db_file.file_path)
-        if not extracted_data:
-            raise HTTPException(status_code=500, detail="Failed to extract data from receipt.")
+        job = await db.run_sync(submit_processing, file_id=db_file.id)
+    except AlreadyQueuedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "file_id": job.file_id,
+        "status": job.status.value,
+        "message": "Receipt queued for processing.",
+    }
+
+
+@router.post("/reextract", response_model=payloads.ReextractResponse, status_code=202)
+async def reextract_receipts(request: payloads.ReextractRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Re-runs AI extraction for processed files from their stored page text, replacing
+    their receipts. Skips rendering and OCR, so only LLM time is spent; use it after
+    changing the model or prompt. Jobs are polled like /process jobs, via /jobs/{job_id}.
+    """
+    return await db.run_sync(submit_reextract, file_ids=request.file_ids)
+
+
+# ----------------------------------------
+# Processing Jobs
+# ----------------------------------------
+
+@router.get("/jobs", response_model=payloads.QueueStatsResponse)
+async def get_queue_stats():
+    """
+    Returns the current depth of the processing queue.
+    """
+    return job_queue.stats()
+
 
-        # Create records
-        new_receipt = create_receipt_and_items(db, extracted_data=extracted_data, file_id=db_file.id)
-        mark_as_processed(db, file_id=db_file.id)
+# Processing states of a receipt file, as job statuses
+_JOB_STATUS_BY_FILE_STATUS = {
+    "queued": JobStatus.QUEUED,
+    "running": JobStatus.RUNNING,
+    "done": JobStatus.SUCCEEDED,
+    "failed": JobStatus.FAILED,
+}
 
-        logger.info(f"Processed receipt ID: {new_receipt.id}")
-        return {"receipt_id": new_receipt.id, "message": "Receipt processed successfully."}
 
-    except Exception as e:
-        logger.exception("Exception during receipt processing")
-        raise HTTPException(status_code=500, detail=f"An error occurred during processing: {str(e)}")
+@router.get("/jobs/{job_id}", response_model=payloads.JobResponse)
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns the status of a processing job and, once finished, its receipt ID or error.
+
+    Jobs are tracked in memory by the process that queued them. When another worker
+    or replica (or a restart) answers, the status comes from the file's processing
+    state in the database instead, without the per-page details.
+    """
+    job = job_queue.get(job_id) or reextract_queue.get(job_id)
+    if job is None:
+        return await _job_status_from_file(db, job_id)
+    return {
+        "job_id": job.id,
+        "file_id": job.file_id,
+        "status": job.status.value,
+        "receipt_id": job.result.receipt_id if job.result else None,
+        "failed_pages": job.result.failed_pages if job.result else [],
+        "text_layer_pages": job.result.text_layer_pages if job.result else 0,
+        "ocr_pages": job.result.ocr_pages if job.result else 0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def _job_status_from_file(db: AsyncSession, job_id: str) -> dict:
+    file_id = job_file_id(job_id)
+    db_file = await aio.get_receipt_file(db, file_id=file_id) if file_id is not None else None
+    status = _JOB_STATUS_BY_FILE_STATUS.get(db_file.status) if db_file else None
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    finished = status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+    return {
+        "job_id": job_id,
+        "file_id": file_id,
+        "status": status.value,
+        "receipt_id": await aio.get_receipt_id_for_file(db, file_id=file_id) if status == JobStatus.SUCCEEDED else None,
+        "error": db_file.last_error if status == JobStatus.FAILED else None,
+        "created_at": db_file.created_at,
+        "finished_at": db_file.updated_at if finished else None,
+    }
+
+
+@router.get("/files/{file_id}/status", response_model=payloads.FileStatusResponse)
+async def get_file_status(file_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns the processing state of a receipt file as stored in the database, so it
+    is the same whichever worker or replica answers: status, attempts so far, the
+    last error and, once processed, the receipt ID.
+    """
+    db_file = await aio.get_receipt_file(db, file_id=file_id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {
+        "file_id": db_file.id,
+        "is_valid": db_file.is_valid,
+        "is_processed": db_file.is_processed,
+        "status": db_file.status,
+        "attempts": db_file.attempts,
+        "last_error": db_file.last_error,
+        "receipt_id": await aio.get_receipt_id_for_file(db, file_id=file_id) if db_file.is_processed else None,
+        "updated_at": db_file.updated_at,
+    }
+
+
+# ----------------------------------------
+# Spend Analytics
+# ----------------------------------------
+
+@router.get("/analytics/spend", response_model=List[payloads.SpendSummaryRow])
+async def get_spend_analytics(
+        group_by: Literal["merchant", "day", "month", "merchant_day", "merchant_month"] = "merchant_month",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        merchant: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Spend totals, counts and averages grouped by merchant and/or time bucket.
+    Served from a summary table updated as receipts are created, so cost does not grow with history.
+    """
+    return await aio.get_spend_summary(db, group_by=group_by, start=start, end=end, merchant=merchant)
+
+
+# ----------------------------------------
+# LLM Cache Statistics
+# ----------------------------------------
+
+@router.get("/llm/cache", response_model=payloads.LLMCacheStatsResponse)
+async def get_llm_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns the size of the LLM extraction cache and its hit/miss counters.
+    """
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats(entries=await aio.count_llm_cache_entries(db))}
 
 
 # ----------------------------------------
@@ -127,24 +349,125 @@ def process_receipt(request: payloads.ProcessRequest, db: Session = Depends(get_
 # ----------------------------------------
 
 @router.get("/receipts", response_model=List[receipt.Receipt])
-def list_receipts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def list_receipts(
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_items: bool = True,
+        merchant: Optional[str] = None,
+        purchased_from: Optional[datetime] = None,
+        purchased_to: Optional[datetime] = None,
+        min_total: Optional[float] = None,
+        max_total: Optional[float] = None,
+        sort: ReceiptSort = "created_at",
+        db: AsyncSession = Depends(get_async_db),
+):
     """
-    Lists all receipts with their items.
+    Lists receipts, optionally with their items.
+    Filters by exact merchant name, purchase date range and total amount range,
+    sorted by `sort` (prefix "-" for descending).
+    For large tables, pass the `X-Next-Cursor` response header back as `cursor`
+    to fetch the next page instead of using `skip`.
     """
-    receipts = get_all_receipts(db, skip=skip, limit=limit)
-    return receipts
+    after = None
+    if cursor:
+        try:
+            after = decode_receipt_cursor(cursor, sort=sort)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    filters = receipt_filter_clauses(
+        merchant=merchant,
+        purchased_from=purchased_from,
+        purchased_to=purchased_to,
+        min_total=min_total,
+        max_total=max_total,
+    )
+    rows, last = await aio.get_receipt_rows(
+        db, skip=skip, limit=limit, after=after, include_items=include_items, sort=sort, filters=filters
+    )
+    headers = {}
+    if rows and len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_receipt_cursor(*last, sort=sort)
+    # Rows are already in the response shape; skip ORM objects and Pydantic validation.
+    return ORJSONResponse(rows, headers=headers)
+
+
+# ----------------------------------------
+# Export Receipts
+# ----------------------------------------
+
+@router.get("/receipts/export")
+async def export_receipts_endpoint(
+        format: Literal["ndjson", "csv"] = "ndjson",
+        since: Optional[datetime] = None,
+        since_field: Literal["created_at", "updated_at"] = "created_at",
+        include_items: bool = True,
+):
+    """
+    Streams all receipts (optionally only those created/updated since a timestamp)
+    as NDJSON or CSV, in id order, with constant memory.
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_receipts(fmt=format, since=since, since_field=since_field, include_items=include_items),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="receipts.{format}"'},
+    )
+
+
+# ----------------------------------------
+# Search Receipts
+# ----------------------------------------
+
+@router.get("/receipts/search", response_model=List[receipt.Receipt])
+async def search_receipts_endpoint(
+        q: str,
+        limit: int = 20,
+        fuzzy: bool = False,
+        include_items: bool = True,
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Full-text search over merchant names and item descriptions, best match first.
+    Every word must match as a prefix; `fuzzy=true` also matches misspelled merchant names.
+    """
+    if not IS_SQLITE:
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite FTS5.")
+    return await aio.search_receipts(db, q, limit=limit, fuzzy=fuzzy, include_items=include_items)
 
 
 # ----------------------------------------
 # Get Specific Receipt
 # ----------------------------------------
 
-@router.get("/receipts/{receipt_id}", response_model=receipt.Receipt)
-def get_receipt_details(receipt_id: int, db: Session = Depends(get_db)):
+@router.get(
+    "/receipts/{receipt_id}",
+    response_model=receipt.Receipt,
+    responses={304: {"description": "Not modified (`If-None-Match` matches the current ETag)"}},
+)
+async def get_receipt_details(
+        receipt_id: int,
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db),
+):
     """
     Retrieves a single receipt by ID with full item detail.
+    Responses carry a strong ETag; send it back in `If-None-Match` to get 304 if unchanged.
+    Serialized responses are cached in memory, so repeated lookups skip the database.
     """
-    db_receipt = get_receipt(db, receipt_id=receipt_id)
-    if db_receipt is None:
-        raise HTTPException(status_code=404, detail="Receipt not found")
-    return db_receipt
+    cached = receipt_cache.get(receipt_id) if receipt_cache else None
+    if cached is not None:
+        body, etag = cached.body, cached.etag
+    else:
+        version = receipt_cache.version() if receipt_cache else 0
+        row = await aio.get_receipt_row(db, receipt_id=receipt_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Receipt not found")
+        body = orjson.dumps(row)
+        etag = receipt_cache.set(receipt_id, body, version=version).etag if receipt_cache else make_etag(body)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
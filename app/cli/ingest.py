@@ -0,0 +1,261 @@
+"""
+Offline bulk ingestion for historical backfills, bypassing the HTTP API.
+
+Walks a directory (or reads a manifest of paths) and runs validation, OCR and
+AI extraction for every PDF across a process pool. Results are written through
+the regular CRUD functions in batched transactions, and every committed batch
+is appended to a checkpoint file so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m app.cli.ingest /path/to/pdfs --workers 8 --batch-size 50
+    python -m app.cli.ingest --manifest paths.txt --checkpoint backfill.checkpoint
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal, engine
+from app.core.migrations import init_database
+from app.crud import (
+    create_receipt_and_items,
+    create_receipt_file,
+    get_receipt_file_by_hash,
+    save_receipt_pages,
+    update_validation_status,
+)
+from app.services import ocr_service
+from app.services.pipeline import SEARCH_INDEX_OCR_TEXT
+from app.services.storage import local_path, save_upload
+from utils.logging import log
+
+logger = log(__name__)
+
+
+# ----------------------------------------
+# Worker Side (runs in the process pool)
+# ----------------------------------------
+
+def _init_worker(workers: int) -> None:
+    # Parallelism comes from processing many files at once; pages within a file run serially.
+    ocr_service.OCR_WORKERS = 1
+
+    # Every worker builds its own LLM client, so split the configured limits between them
+    # to keep the run as a whole within them. Runs before the client is first created.
+    from app.services import llm_service
+
+    llm_service.LLM_MAX_CONCURRENCY = max(1, llm_service.LLM_MAX_CONCURRENCY // workers)
+    llm_service.LLM_REQUESTS_PER_MINUTE = llm_service.LLM_REQUESTS_PER_MINUTE / workers
+    llm_service.LLM_TOKENS_PER_MINUTE = llm_service.LLM_TOKENS_PER_MINUTE / workers
+
+
+def _process_path(source: str) -> dict[str, Any]:
+    """
+    Stores, validates and extracts one PDF. Never raises; failures are reported in the result.
+    """
+    result: dict[str, Any] = {"source": source, "file_name": Path(source).name, "pages": 0}
+    try:
+        with open(source, "rb") as f:
+            stored = save_upload(f, suffix=Path(source).suffix or ".pdf")
+        result.update(file_path=str(stored.path), sha256=stored.sha256)
+
+        db = SessionLocal()
+        try:
+            existing = get_receipt_file_by_hash(db, content_hash=stored.sha256)
+            if existing is not None and (existing.is_processed or existing.is_valid is False):
+                result["status"] = "duplicate"
+                return result
+        finally:
+            db.close()
+
+        with local_path(stored.path) as path:
+            is_valid, reason = ocr_service.validate_pdf(path)
+            result.update(is_valid=is_valid, reason=reason)
+            if not is_valid:
+                result["status"] = "invalid"
+                return result
+
+            pages = ocr_service.extract_pages(path)
+        if pages is None:
+            raise RuntimeError("Failed to render receipt PDF.")
+        result["pages"] = len(pages)
+
+        extracted_data = ocr_service.parse_pages(pages)
+        if not extracted_data:
+            raise RuntimeError("Failed to extract data from receipt.")
+
+        result.update(
+            status="extracted",
+            extracted_data=extracted_data,
+            page_records=pages,
+            ocr_text=ocr_service.join_pages(pages) if SEARCH_INDEX_OCR_TEXT else None,
+        )
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+    return result
+
+
+# ----------------------------------------
+# Parent Side (writes and checkpoints)
+# ----------------------------------------
+
+def _write_result(db: Session, result: dict[str, Any], written: set[str]) -> str:
+    """
+    Stages one worker result in the current transaction without committing,
+    and returns its final status. Checks are done before any write, so a
+    rejected result leaves nothing behind. `written` holds hashes already
+    staged in this transaction.
+    """
+    if result["status"] not in ("invalid", "extracted"):
+        return result["status"]
+    if result["sha256"] in written:
+        return "duplicate"
+
+    db_file = get_receipt_file_by_hash(db, content_hash=result["sha256"])
+    if db_file is not None and (db_file.is_processed or db_file.is_valid is False):
+        return "duplicate"
+    if db_file is None:
+        db_file = create_receipt_file(
+            db, file_name=result["file_name"], file_path=result["file_path"], content_hash=result["sha256"],
+            commit=False,
+        )
+    written.add(result["sha256"])
+
+    update_validation_status(db, file_id=db_file.id, is_valid=result["is_valid"], reason=result["reason"], commit=False)
+    if result["status"] == "invalid":
+        return "invalid"
+
+    save_receipt_pages(db, file_id=db_file.id, pages=result["page_records"], commit=False)
+    create_receipt_and_items(
+        db,
+        extracted_data=result["extracted_data"],
+        file_id=db_file.id,
+        ocr_text=result["ocr_text"],
+        commit=False,
+    )
+    return "processed"
+
+
+def _write_batch(results: list[dict[str, Any]]) -> None:
+    """
+    Writes a batch in one transaction. If that fails, retries the results one
+    by one so a single bad record does not sink the rest of the batch.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            written: set[str] = set()
+            statuses = [_write_result(db, result, written) for result in results]
+            db.commit()
+            for result, status in zip(results, statuses):
+                result["status"] = status
+            return
+        except Exception:
+            db.rollback()
+            logger.exception("Batch write failed; retrying records individually")
+
+        written = set()
+        for result in results:
+            try:
+                status = _write_result(db, result, written)
+                db.commit()
+                result["status"] = status
+            except Exception as e:
+                db.rollback()
+                written.discard(result.get("sha256"))
+                result.update(status="failed", error=str(e))
+    finally:
+        db.close()
+
+
+def _load_checkpoint(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    with path.open() as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def _append_checkpoint(path: Path, sources: Iterable[str]) -> None:
+    with path.open("a") as f:
+        for source in sources:
+            f.write(source + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _collect_sources(directory: str | None, manifest: str | None) -> list[str]:
+    if manifest:
+        with open(manifest) as f:
+            return [str(Path(line.strip()).resolve()) for line in f if line.strip()]
+    return sorted(str(p.resolve()) for p in Path(directory).rglob("*") if p.suffix.lower() == ".pdf")
+
+
+def run(
+        sources: list[str],
+        checkpoint: Path,
+        workers: int,
+        batch_size: int,
+) -> Counter:
+    done = _load_checkpoint(checkpoint)
+    todo = [s for s in sources if s not in done]
+    logger.info(f"{len(sources)} file(s) found, {len(sources) - len(todo)} already done, {len(todo)} to ingest.")
+
+    init_database(engine)
+
+    totals: Counter = Counter()
+    started = time.monotonic()
+    batch: list[dict[str, Any]] = []
+
+    def flush() -> None:
+        _write_batch(batch)
+        _append_checkpoint(checkpoint, [r["source"] for r in batch if r["status"] != "failed"])
+        for r in batch:
+            totals[r["status"]] += 1
+            totals["pages"] += r["pages"]
+            if r["status"] == "failed":
+                logger.warning(f"Failed: {r['source']}: {r.get('error')}")
+        batch.clear()
+
+        elapsed = time.monotonic() - started
+        count = sum(totals[s] for s in ("processed", "invalid", "duplicate", "failed"))
+        logger.info(
+            f"{count}/{len(todo)} files | {count / elapsed:.2f} files/s, {totals['pages'] / elapsed:.2f} pages/s | "
+            f"processed={totals['processed']} invalid={totals['invalid']} "
+            f"duplicate={totals['duplicate']} failed={totals['failed']}"
+        )
+
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(workers,)) as pool:
+        for result in pool.imap_unordered(_process_path, todo):
+            batch.append(result)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", help="Directory to scan recursively for PDFs")
+    parser.add_argument("--manifest", help="File with one PDF path per line (instead of a directory)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--batch-size", type=int, default=50, help="Results written per transaction")
+    parser.add_argument("--checkpoint", default=".ingest.checkpoint", help="Checkpoint file for resuming")
+    args = parser.parse_args()
+
+    if not args.directory and not args.manifest:
+        parser.error("either a directory or --manifest is required")
+
+    sources = _collect_sources(args.directory, args.manifest)
+    totals = run(sources, Path(args.checkpoint), workers=args.workers, batch_size=args.batch_size)
+    logger.info(f"Done: {dict(totals)}")
+
+
+if __name__ == "__main__":
+    main()
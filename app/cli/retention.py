@@ -0,0 +1,43 @@
+"""
+Deletes stored receipt files that the retention policy no longer requires.
+
+Files of invalid uploads and of processed receipts (whose page text is stored, so
+they can still be re-extracted) are removed once older than the configured number
+of days; database records are kept and marked as purged. Defaults come from
+RETENTION_INVALID_DAYS and RETENTION_PROCESSED_DAYS (0 = keep forever).
+
+Usage:
+    python -m app.cli.retention --dry-run
+    python -m app.cli.retention --invalid-days 7 --processed-days 365
+"""
+import argparse
+
+from app.core.database import engine
+from app.core.migrations import init_database
+from app.services.retention import RETENTION_INVALID_DAYS, RETENTION_PROCESSED_DAYS, run_retention
+from utils.logging import log
+
+logger = log(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invalid-days", type=float, default=RETENTION_INVALID_DAYS,
+                        help="Delete files of invalid uploads after this many days (0 = never)")
+    parser.add_argument("--processed-days", type=float, default=RETENTION_PROCESSED_DAYS,
+                        help="Delete files of processed receipts after this many days (0 = never)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    args = parser.parse_args()
+
+    init_database(engine)
+    totals = run_retention(invalid_days=args.invalid_days, processed_days=args.processed_days, dry_run=args.dry_run)
+    logger.info(
+        f"{'Would delete' if args.dry_run else 'Deleted'} {totals['purged']} file(s), "
+        f"{totals['bytes'] / 1024 ** 2:.1f} MiB; {totals['missing']} already missing, "
+        f"{totals['restored']} kept after being uploaded again, "
+        f"{totals['partial']} partial upload(s) removed."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
-from app.core.database import SessionLocal
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal, SessionLocal
 
 
 def get_db():
@@ -16,3 +20,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Async counterpart of `get_db`, used by the API routes. The session only takes
+    a connection from the pool once it runs its first statement.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
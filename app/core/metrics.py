@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+# ----------------------------------------
+# Prometheus Metrics
+# ----------------------------------------
+
+# Metrics live in the default registry and are served by GET /metrics. They are
+# per process: with several uvicorn workers, scrape each one (or run one worker
+# per container). OCR pool processes report their timings back to the parent,
+# which records them here.
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "receiptiq_stage_duration_seconds",
+    "Time spent in a processing stage: text_layer (per document), pdf_render and ocr (per page), "
+    "llm (per API call) and db_commit (per commit).",
+    ["stage"],
+    buckets=_SECONDS_BUCKETS,
+)
+LLM_TOKENS = Histogram(
+    "receiptiq_llm_tokens",
+    "Tokens used per LLM call.",
+    ["kind"],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+FAILURES = Counter(
+    "receiptiq_failures_total",
+    "Failures by stage: ocr_page (a page failed OCR), llm (no usable response after retries), "
+    "llm_retry (a call was retried) and job (a background job failed).",
+    ["stage"],
+)
+LLM_CACHE_REQUESTS = Counter(
+    "receiptiq_llm_cache_requests_total",
+    "LLM cache lookups by result (hit or miss).",
+    ["result"],
+)
+RECEIPT_CACHE_REQUESTS = Counter(
+    "receiptiq_receipt_cache_requests_total",
+    "GET /receipts/{receipt_id} response cache lookups by result (hit or miss).",
+    ["result"],
+)
+LLM_IN_PROGRESS = Gauge(
+    "receiptiq_llm_requests_in_progress",
+    "LLM API calls currently in flight.",
+)
+JOBS = Counter(
+    "receiptiq_jobs_total",
+    "Finished background jobs by queue and status.",
+    ["queue", "status"],
+)
+JOB_SECONDS = Histogram(
+    "receiptiq_job_duration_seconds",
+    "Run time of background jobs, from start to finish.",
+    ["queue"],
+    buckets=_SECONDS_BUCKETS,
+)
+JOBS_IN_PROGRESS = Gauge(
+    "receiptiq_jobs_in_progress",
+    "Background jobs currently running.",
+    ["queue"],
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "receiptiq_job_queue_depth",
+    "Background jobs waiting to run.",
+    ["queue"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "receiptiq_http_request_duration_seconds",
+    "HTTP request latency by method, route template and status code.",
+    ["method", "route", "status"],
+    buckets=_SECONDS_BUCKETS,
+)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """
+    Records the duration of the enclosed block under `stage`, even if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def counter_value(counter: Counter, **labels: str) -> float:
+    """
+    Current value of one labelled series of `counter` in this process (0 if never incremented).
+    """
+    for metric in counter.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total") and sample.labels == labels:
+                return sample.value
+    return 0.0
+
+
+def instrument_sessions(session_factory: sessionmaker | type[Session]) -> None:
+    """
+    Times every commit (including its final flush) of sessions from `session_factory`.
+    """
+
+    @event.listens_for(session_factory, "before_commit")
+    def _before_commit(session):
+        session.info["commit_started"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def _after_commit(session):
+        started = session.info.pop("commit_started", None)
+        if started is not None:
+            STAGE_SECONDS.labels("db_commit").observe(time.perf_counter() - started)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop("commit_started", None)
@@ -0,0 +1,87 @@
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.crud import ensure_search_index, ensure_spend_summary
+from app.models import Base
+from utils.logging import log
+
+logger = log(__name__)
+
+# ----------------------------------------
+# Schema Upgrades
+# ----------------------------------------
+
+# `create_all` creates missing tables but never alters existing ones, so a database
+# created by an older version lacks the columns and indexes added since. Upgrading is
+# additive only and safe to repeat: missing columns are added with ALTER TABLE ADD
+# COLUMN and missing indexes are created, both checked against the live schema first.
+
+
+def _column_default(conn: Connection, column: Column) -> str | None:
+    """
+    Returns the SQL DEFAULT clause value for a column being added, so that existing
+    rows get a value for NOT NULL columns.
+    """
+    if column.server_default is not None:
+        arg = column.server_default.arg
+        return arg if isinstance(arg, str) else str(arg.compile(dialect=conn.dialect))
+    if column.default is not None and column.default.is_scalar:
+        value = column.default.arg
+        if isinstance(value, bool):
+            return "1" if value else "0"
+        if isinstance(value, (int, float)):
+            return str(value)
+        return "'" + str(value).replace("'", "''") + "'"
+    return None
+
+
+def _add_column(conn: Connection, table_name: str, column: Column) -> None:
+    preparer = conn.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} "
+        f"{column.type.compile(dialect=conn.dialect)}"
+    )
+    default = _column_default(conn, column)
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+    if not column.nullable and default is not None:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Brings existing tables up to date with the models: adds missing columns and
+    creates missing indexes. Tables that do not exist yet are left to `create_all`.
+
+    Unique constraints on added columns are enforced by their unique index
+    (e.g. `receipt_file.content_hash`), as SQLite cannot add UNIQUE columns.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    logger.info(f"Adding column {table.name}.{column.name}")
+                    _add_column(conn, table.name, column)
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    logger.info(f"Creating index {index.name}")
+                    index.create(conn, checkfirst=True)
+
+
+def init_database(engine: Engine) -> None:
+    """
+    Creates missing tables, upgrades existing ones and builds the derived tables
+    (search index, spend summary). Run on API startup and by the CLIs.
+    """
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    ensure_search_index(engine)
+    ensure_spend_summary(engine)
@@ -0,0 +1,79 @@
+import threading
+from typing import Any, Callable
+
+from utils.logging import log
+
+logger = log(__name__)
+
+# ----------------------------------------
+# Service Registry
+# ----------------------------------------
+
+# Expensive shared services (LLM client, worker pools) are registered here by
+# name with a factory and created on first use, so importing the app, running a
+# CLI or serving reads never pays for services it does not touch. The app's
+# lifespan closes whatever was created, in reverse order of creation, once the
+# workers using them have exited; after that no service can be created again.
+
+
+class RegistryClosedError(RuntimeError):
+    """Raised when a service is requested after the registry was closed."""
+
+
+class ServiceRegistry:
+    def __init__(self):
+        self._factories: dict[str, tuple[Callable[[], Any], Callable[[Any], Any] | None]] = {}
+        self._instances: dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._closed = False
+
+    def register(self, name: str, factory: Callable[[], Any], close: Callable[[Any], Any] | None = None) -> None:
+        """
+        Registers how to create (and optionally close) a service. Registering a
+        name again replaces its factory, e.g. to swap in a fake; an instance that
+        was already created is kept until `close`.
+        """
+        with self._lock:
+            self._factories[name] = (factory, close)
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the shared instance of a service, creating it on first use.
+
+        Raises:
+            RegistryClosedError: If the registry was closed (the app is shutting down).
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._closed:
+                raise RegistryClosedError(f"Service registry is closed; cannot create {name}.")
+            if name not in self._instances:
+                factory, _ = self._factories[name]
+                self._instances[name] = factory()
+                logger.info(f"Service created: {name}")
+            return self._instances[name]
+
+    def close(self) -> None:
+        """
+        Closes every created service, most recently created first, and refuses
+        to create any more.
+        """
+        with self._lock:
+            self._closed = True
+            while self._instances:
+                name, instance = self._instances.popitem()
+                self._close(name, instance)
+
+    def _close(self, name: str, instance: Any) -> None:
+        _, close = self._factories.get(name, (None, None))
+        if close is None:
+            return
+        try:
+            close(instance)
+        except Exception:
+            logger.exception(f"Failed to close service: {name}")
+
+
+services = ServiceRegistry()
@@ -1,2 +1,6 @@
+from app.crud.analytics import *
+from app.crud.llm_cache import *
 from app.crud.receipt import *
 from app.crud.receipt_file import *
+from app.crud.receipt_page import *
+from app.crud.search import *
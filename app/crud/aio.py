@@ -0,0 +1,44 @@
+"""
+Async variants of the CRUD functions used by the API routes.
+
+Each one takes an `AsyncSession` and runs the sync function of the same name on
+that session's underlying `Session` via `AsyncSession.run_sync`, so the queries
+are defined once while the driver I/O (aiosqlite, asyncpg) is awaited on the
+event loop instead of blocking a thread.
+
+Import the module rather than its names, as they shadow the sync ones in `app.crud`:
+
+    from app.crud import aio
+    db_file = await aio.get_receipt_file(db, file_id=file_id)
+"""
+import functools
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import analytics, llm_cache, receipt, receipt_file, search
+
+
+def _async_variant(fn: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+
+    return wrapper
+
+
+# Receipt files
+get_receipt_file = _async_variant(receipt_file.get_receipt_file)
+update_validation_status = _async_variant(receipt_file.update_validation_status)
+
+# Receipts
+get_receipt_id_for_file = _async_variant(receipt.get_receipt_id_for_file)
+get_receipt_row = _async_variant(receipt.get_receipt_row)
+get_receipt_rows = _async_variant(receipt.get_receipt_rows)
+
+# Search and analytics
+search_receipts = _async_variant(search.search_receipts)
+get_spend_summary = _async_variant(analytics.get_spend_summary)
+
+# LLM cache
+count_llm_cache_entries = _async_variant(llm_cache.count_llm_cache_entries)
@@ -0,0 +1,177 @@
+from datetime import date, datetime, timezone
+from typing import Any
+
+from sqlalchemy import Date, cast, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models import Receipt, ReceiptItem, SpendSummary
+from utils.logging import log
+
+logger = log(__name__)
+
+# Supported `group_by` values for `get_spend_summary`
+SPEND_GROUPINGS = ("merchant", "day", "month", "merchant_day", "merchant_month")
+
+
+def spend_day(purchased_at: datetime | None, created_at: datetime | None = None) -> date:
+    """
+    Day bucket of a receipt: its purchase date, or the day it was recorded if that is
+    unknown, like `ensure_spend_summary`. Today only if neither is known yet.
+    """
+    return (purchased_at or created_at or datetime.now(timezone.utc)).date()
+
+
+def apply_spend_delta(
+        db: Session,
+        merchant_name: str | None,
+        day: date,
+        receipt_count: int,
+        total_amount: float,
+        item_count: int,
+        item_price_total: float,
+) -> None:
+    """
+    Adds (or, with negative values, removes) a receipt's contribution to the daily
+    summary row inside the caller's transaction, using a single upsert.
+    """
+    values = {
+        "merchant_name": merchant_name or "",
+        "day": day,
+        "receipt_count": receipt_count,
+        "total_amount": total_amount,
+        "item_count": item_count,
+        "item_price_total": item_price_total,
+    }
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(SpendSummary).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SpendSummary.merchant_name, SpendSummary.day],
+            set_={
+                "receipt_count": SpendSummary.receipt_count + stmt.excluded.receipt_count,
+                "total_amount": SpendSummary.total_amount + stmt.excluded.total_amount,
+                "item_count": SpendSummary.item_count + stmt.excluded.item_count,
+                "item_price_total": SpendSummary.item_price_total + stmt.excluded.item_price_total,
+            },
+        )
+        db.execute(stmt)
+        return
+
+    row = db.get(SpendSummary, (values["merchant_name"], day))
+    if row is None:
+        db.add(SpendSummary(**values))
+    else:
+        row.receipt_count += receipt_count
+        row.total_amount += total_amount
+        row.item_count += item_count
+        row.item_price_total += item_price_total
+
+
+def _day_expr(expr, dialect: str):
+    # SQLite has no DATE type; CAST would turn a timestamp string into a number.
+    return func.date(expr) if dialect == "sqlite" else cast(expr, Date)
+
+
+def _month_expr(expr, dialect: str):
+    return func.strftime("%Y-%m", expr) if dialect == "sqlite" else func.to_char(expr, "YYYY-MM")
+
+
+def ensure_spend_summary(engine: Engine) -> None:
+    """
+    Builds the summary table from existing receipts the first time it is empty.
+    From then on it is only updated incrementally.
+    """
+    with engine.begin() as conn:
+        if conn.execute(select(SpendSummary.day).limit(1)).first() is not None:
+            return
+        if conn.execute(select(Receipt.id).limit(1)).first() is None:
+            return
+
+        logger.info("Building spend summary from existing receipts...")
+        items = (
+            select(
+                ReceiptItem.receipt_id,
+                func.count().label("item_count"),
+                func.sum(ReceiptItem.price).label("item_price_total"),
+            )
+            .group_by(ReceiptItem.receipt_id)
+            .subquery()
+        )
+        merchant = func.coalesce(Receipt.merchant_name, "")
+        day = _day_expr(func.coalesce(Receipt.purchased_at, Receipt.created_at), engine.dialect.name)
+        rows = (
+            select(
+                merchant,
+                day,
+                func.count(),
+                func.sum(func.coalesce(Receipt.total_amount, 0.0)),
+                func.sum(func.coalesce(items.c.item_count, 0)),
+                func.sum(func.coalesce(items.c.item_price_total, 0.0)),
+            )
+            .outerjoin(items, items.c.receipt_id == Receipt.id)
+            .group_by(merchant, day)
+        )
+        conn.execute(insert(SpendSummary).from_select(
+            ["merchant_name", "day", "receipt_count", "total_amount", "item_count", "item_price_total"],
+            rows,
+        ))
+
+
+def get_spend_summary(
+        db: Session,
+        group_by: str = "merchant_month",
+        start: date | None = None,
+        end: date | None = None,
+        merchant: str | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Totals, counts and averages of receipt amounts and item prices, grouped by
+    merchant and/or day/month. Reads only the pre-aggregated daily summary rows.
+    """
+    if group_by not in SPEND_GROUPINGS:
+        raise ValueError(f"Invalid group_by: {group_by}")
+
+    group_cols = []
+    if group_by.startswith("merchant"):
+        group_cols.append(SpendSummary.merchant_name.label("merchant_name"))
+    if group_by.endswith("day"):
+        group_cols.append(SpendSummary.day.label("period"))
+    elif group_by.endswith("month"):
+        group_cols.append(_month_expr(SpendSummary.day, db.get_bind().dialect.name).label("period"))
+
+    query = select(
+        *group_cols,
+        func.sum(SpendSummary.receipt_count).label("receipt_count"),
+        func.sum(SpendSummary.total_amount).label("total_amount"),
+        func.sum(SpendSummary.item_count).label("item_count"),
+        func.sum(SpendSummary.item_price_total).label("item_price_total"),
+    ).group_by(*group_cols).order_by(*group_cols)
+
+    if start is not None:
+        query = query.where(SpendSummary.day >= start)
+    if end is not None:
+        query = query.where(SpendSummary.day <= end)
+    if merchant is not None:
+        query = query.where(SpendSummary.merchant_name == merchant)
+
+    results = []
+    for row in db.execute(query).mappings():
+        if not row["receipt_count"]:
+            continue
+        period = row.get("period")
+        results.append({
+            "merchant_name": row.get("merchant_name") or None,
+            "period": period.isoformat() if isinstance(period, date) else period,
+            "receipt_count": row["receipt_count"],
+            "total_amount": row["total_amount"],
+            "average_amount": row["total_amount"] / row["receipt_count"],
+            "item_count": row["item_count"],
+            "item_price_total": row["item_price_total"],
+            "average_item_price": row["item_price_total"] / row["item_count"] if row["item_count"] else None,
+        })
+    return results
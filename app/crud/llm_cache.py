@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+
+from app.models import LLMCacheEntry
+
+
+def get_llm_cache_entry(db: Session, key: str) -> LLMCacheEntry | None:
+    return db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).first()
+
+
+def touch_llm_cache_entries(db: Session, touches: dict[str, tuple[int, datetime]]) -> None:
+    """
+    Records cache hits collected since the last call, in one statement and commit:
+    `touches` maps each key to its number of hits and the time of the latest one.
+    """
+    if not touches:
+        return
+    table = LLMCacheEntry.__table__
+    db.execute(
+        table.update()
+        .where(table.c.key == bindparam("touched_key"))
+        .values(hit_count=table.c.hit_count + bindparam("hits"), last_used_at=bindparam("used_at")),
+        [{"touched_key": key, "hits": hits, "used_at": used_at} for key, (hits, used_at) in touches.items()],
+    )
+    db.commit()
+
+
+def put_llm_cache_entry(db: Session, key: str, model_id: str | None, prompt_version: str, response: str) -> None:
+    db.merge(LLMCacheEntry(
+        key=key,
+        model_id=model_id,
+        prompt_version=prompt_version,
+        response=response,
+        hit_count=0,
+        last_used_at=datetime.now(timezone.utc),
+    ))
+    db.commit()
+
+
+def count_llm_cache_entries(db: Session) -> int:
+    return db.query(func.count(LLMCacheEntry.key)).scalar()
+
+
+def evict_llm_cache_entries(db: Session, max_entries: int) -> int:
+    """
+    Deletes the least recently used entries until at most `max_entries` remain.
+    """
+    excess = count_llm_cache_entries(db) - max_entries
+    if excess <= 0:
+        return 0
+    oldest = db.query(LLMCacheEntry.key).order_by(LLMCacheEntry.last_used_at).limit(excess)
+    deleted = (
+        db.query(LLMCacheEntry)
+        .filter(LLMCacheEntry.key.in_(oldest.scalar_subquery()))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
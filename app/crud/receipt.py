@@ -1,20 +1,294 @@
-from typing import Any
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Iterator
 
 from dateutil import parser
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session, joinedload, noload, selectinload
 
-from app.models import Receipt, ReceiptItem
+from app.crud.analytics import apply_spend_delta, spend_day
+from app.crud.search import index_receipt, remove_from_index
+from app.models import ProcessingStatus, Receipt, ReceiptFile, ReceiptItem
 from utils.logging import log
 
 logger = log(__name__)
 
 
+# Session.info key holding the IDs of receipts written in the current transaction,
+# read after commit by listeners such as the receipt response cache.
+CHANGED_RECEIPTS_KEY = "changed_receipt_ids"
+
+
+def _track_changed_receipts(db: Session, receipt_ids) -> None:
+    db.info.setdefault(CHANGED_RECEIPTS_KEY, set()).update(receipt_ids)
+
+
 def get_receipt(db: Session, receipt_id: int) -> Receipt | None:
     return db.query(Receipt).options(joinedload(Receipt.items)).filter(Receipt.id == receipt_id).first()
 
 
-def get_all_receipts(db: Session, skip: int = 0, limit: int = 100) -> list[Receipt]:
-    return db.query(Receipt).options(joinedload(Receipt.items)).offset(skip).limit(limit).all()
+def get_receipt_id_for_file(db: Session, file_id: int) -> int | None:
+    return db.query(Receipt.id).filter(Receipt.receipt_file_id == file_id).order_by(Receipt.id).limit(1).scalar()
+
+
+# Columns `get_all_receipts` can sort by; prefix with "-" for descending order.
+RECEIPT_SORT_COLUMNS = {
+    "created_at": Receipt.created_at,
+    "purchased_at": Receipt.purchased_at,
+    "total_amount": Receipt.total_amount,
+}
+
+
+def _parse_sort(sort: str) -> tuple[str, bool]:
+    name = sort.lstrip("-")
+    if name not in RECEIPT_SORT_COLUMNS:
+        raise ValueError(f"Invalid sort: {sort}")
+    return name, sort.startswith("-")
+
+
+def encode_receipt_cursor(value: Any, receipt_id: int, sort: str = "created_at") -> str:
+    """
+    Opaque keyset cursor pointing just after the receipt with `receipt_id` and
+    sort column `value` in `sort` order.
+    """
+    _parse_sort(sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, receipt_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_receipt_cursor(cursor: str, sort: str = "created_at") -> tuple[Any, int]:
+    """
+    Raises:
+        ValueError: If the cursor is malformed or was issued for a different sort order.
+    """
+    try:
+        cursor_sort, value, receipt_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_sort != sort:
+            raise ValueError("Cursor does not match sort order")
+        name, _ = _parse_sort(sort)
+        if value is not None and name in ("created_at", "purchased_at"):
+            value = datetime.fromisoformat(value)
+        return value, int(receipt_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def receipt_filter_clauses(
+        merchant: str | None = None,
+        purchased_from: datetime | None = None,
+        purchased_to: datetime | None = None,
+        min_total: float | None = None,
+        max_total: float | None = None,
+) -> list:
+    """
+    WHERE clauses for the indexed receipt filters. Date and amount ranges are inclusive.
+    """
+    clauses = []
+    if merchant is not None:
+        clauses.append(Receipt.merchant_name == merchant)
+    if purchased_from is not None:
+        clauses.append(Receipt.purchased_at >= purchased_from)
+    if purchased_to is not None:
+        clauses.append(Receipt.purchased_at <= purchased_to)
+    if min_total is not None:
+        clauses.append(Receipt.total_amount >= min_total)
+    if max_total is not None:
+        clauses.append(Receipt.total_amount <= max_total)
+    return clauses
+
+
+def _keyset_clause(sort: str, value: Any, receipt_id: int):
+    """
+    Matches rows that come after (value, receipt_id) in `sort` order, with NULLs last.
+    """
+    name, descending = _parse_sort(sort)
+    column = RECEIPT_SORT_COLUMNS[name]
+    id_after = Receipt.id < receipt_id if descending else Receipt.id > receipt_id
+    if value is None:
+        return and_(column.is_(None), id_after)
+    value_after = column < value if descending else column > value
+    return or_(value_after, and_(column == value, id_after), column.is_(None))
+
+
+def _order_by(sort: str) -> list:
+    name, descending = _parse_sort(sort)
+    column = RECEIPT_SORT_COLUMNS[name]
+    if descending:
+        order = [column.desc(), Receipt.id.desc()]
+    else:
+        order = [column.asc(), Receipt.id.asc()]
+    if RECEIPT_SORT_COLUMNS[name].nullable:
+        order[0] = order[0].nulls_last()
+    return order
+
+
+def get_all_receipts(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        after: tuple[Any, int] | None = None,
+        include_items: bool = True,
+        sort: str = "created_at",
+        filters: list | None = None,
+) -> list[Receipt]:
+    """
+    Lists receipts in `sort` order (id breaks ties), restricted by `filters`
+    from `receipt_filter_clauses`.
+
+    Pass `after` (from `decode_receipt_cursor`) for keyset pagination, which stays
+    an index range scan however deep the page; `skip` is kept for offset paging.
+    Items are loaded with one extra IN query per page, or not at all.
+    """
+    query = db.query(Receipt).options(selectinload(Receipt.items) if include_items else noload(Receipt.items))
+    if filters:
+        query = query.filter(*filters)
+    if after is not None:
+        query = query.filter(_keyset_clause(sort, *after))
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(*_order_by(sort)).limit(limit).all()
+
+
+# Response columns, in the field order of the `receipt.Receipt` and `ReceiptItem` schemas,
+# so rows can be encoded to JSON directly with the same shape as the models.
+RECEIPT_RESPONSE_COLUMNS = (
+    Receipt.purchased_at,
+    Receipt.merchant_name,
+    Receipt.total_amount,
+    Receipt.id,
+    Receipt.receipt_file_id,
+)
+ITEM_RESPONSE_COLUMNS = (
+    ReceiptItem.description,
+    ReceiptItem.quantity,
+    ReceiptItem.price,
+    ReceiptItem.id,
+    ReceiptItem.receipt_id,
+)
+
+
+def _attach_items(db: Session, rows: list[dict[str, Any]], columns=ITEM_RESPONSE_COLUMNS) -> None:
+    """
+    Sets `row["items"]` on every receipt row, fetching all items with one IN query.
+    """
+    items_by_receipt: dict[int, list[dict[str, Any]]] = {row["id"]: [] for row in rows}
+    if not items_by_receipt:
+        return
+    item_rows = db.execute(
+        select(*columns)
+        .where(ReceiptItem.receipt_id.in_(items_by_receipt))
+        .order_by(ReceiptItem.receipt_id, ReceiptItem.id)
+    ).mappings()
+    for item in item_rows:
+        items_by_receipt[item["receipt_id"]].append(dict(item))
+    for row in rows:
+        row["items"] = items_by_receipt[row["id"]]
+
+
+def get_receipt_rows(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        after: tuple[Any, int] | None = None,
+        include_items: bool = True,
+        sort: str = "created_at",
+        filters: list | None = None,
+) -> tuple[list[dict[str, Any]], tuple[Any, int] | None]:
+    """
+    Same query as `get_all_receipts`, but selects only the response columns and
+    returns plain dicts, ready for JSON encoding without ORM objects or Pydantic.
+    Without `include_items`, rows have an empty "items" list, like the ORM path.
+
+    Returns:
+        tuple: The rows, and the (sort value, id) of the last row for `encode_receipt_cursor`
+        (None if there are no rows).
+    """
+    name, _ = _parse_sort(sort)
+    query = select(*RECEIPT_RESPONSE_COLUMNS, RECEIPT_SORT_COLUMNS[name].label("sort_value"))
+    if filters:
+        query = query.where(*filters)
+    if after is not None:
+        query = query.where(_keyset_clause(sort, *after))
+    elif skip:
+        query = query.offset(skip)
+    result = db.execute(query.order_by(*_order_by(sort)).limit(limit)).all()
+
+    keys = [column.key for column in RECEIPT_RESPONSE_COLUMNS]
+    rows = [dict(zip(keys, row)) for row in result]
+    if include_items:
+        _attach_items(db, rows)
+    else:
+        for row in rows:
+            row["items"] = []
+    last = (result[-1].sort_value, result[-1].id) if result else None
+    return rows, last
+
+
+def get_receipt_row(db: Session, receipt_id: int) -> dict[str, Any] | None:
+    """
+    Returns one receipt with its items as a plain dict (see `get_receipt_rows`), or None.
+    """
+    row = db.execute(select(*RECEIPT_RESPONSE_COLUMNS).where(Receipt.id == receipt_id)).mappings().first()
+    if row is None:
+        return None
+    rows = [dict(row)]
+    _attach_items(db, rows)
+    return rows[0]
+
+
+_EXPORT_ITEM_COLUMNS = (
+    ReceiptItem.id,
+    ReceiptItem.receipt_id,
+    ReceiptItem.description,
+    ReceiptItem.quantity,
+    ReceiptItem.price,
+)
+
+
+def iter_receipt_batches(
+        db: Session,
+        since: datetime | None = None,
+        since_field: str = "created_at",
+        include_items: bool = True,
+        batch_size: int = 1000,
+) -> Iterator[list[dict[str, Any]]]:
+    """
+    Streams receipts as plain dicts, in id order, `batch_size` rows at a time,
+    from a server-side cursor. No ORM objects are built, so memory stays constant.
+
+    `since` keeps receipts created (or, with since_field="updated_at", created or
+    updated) at or after that time. With `include_items`, each dict gets an
+    "items" list fetched with one IN query per batch.
+    """
+    columns = [
+        Receipt.id,
+        Receipt.receipt_file_id,
+        Receipt.merchant_name,
+        Receipt.purchased_at,
+        Receipt.total_amount,
+        Receipt.created_at,
+        Receipt.updated_at,
+    ]
+    query = select(*columns).order_by(Receipt.id)
+    if since is not None:
+        if since_field == "updated_at":
+            query = query.where(or_(
+                Receipt.updated_at >= since,
+                and_(Receipt.updated_at.is_(None), Receipt.created_at >= since),
+            ))
+        else:
+            query = query.where(Receipt.created_at >= since)
+
+    result = db.execute(query.execution_options(yield_per=batch_size)).mappings()
+    for partition in result.partitions():
+        batch = [dict(row) for row in partition]
+        if include_items:
+            _attach_items(db, batch, columns=_EXPORT_ITEM_COLUMNS)
+        yield batch
 
 
 def _safe_parse_date(date_str: str | None) -> Any:
@@ -27,11 +301,35 @@ def _safe_parse_date(date_str: str | None) -> Any:
         return None
 
 
-def create_receipt_and_items(
+def _build_item_rows(receipt_id: int, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    rows = []
+    for item_data in items:
+        if not all(k in item_data for k in ["description", "quantity", "price"]):
+            logger.warning(f"Incomplete item data skipped: {item_data}")
+            continue
+
+        try:
+            rows.append({
+                "receipt_id": receipt_id,
+                "description": item_data["description"],
+                "quantity": float(item_data.get("quantity") or 0.0),
+                "price": float(item_data.get("price") or 0.0),
+            })
+        except (ValueError, TypeError) as e:
+            logger.error(f"Invalid item: {item_data} | Error: {e}")
+            continue
+    return rows
+
+
+def _insert_receipt(
         db: Session,
         extracted_data: dict[str, Any],
-        file_id: int
-) -> Receipt:
+        file_id: int,
+        ocr_text: str | None = None,
+) -> int:
+    """
+    Inserts a receipt and its items, and adds it to the search index and spend summary.
+    """
     parsed_date = _safe_parse_date(extracted_data.get("purchased_at"))
 
     db_receipt = Receipt(
@@ -42,24 +340,160 @@ def create_receipt_and_items(
     )
     db.add(db_receipt)
     db.flush()  # To generate ID for FK
+    receipt_id = db_receipt.id
+    _track_changed_receipts(db, [receipt_id])  # SQLite may reuse the ID of a deleted receipt
 
-    for item_data in extracted_data.get("items", []):
-        if not all(k in item_data for k in ["description", "quantity", "price"]):
-            logger.warning(f"Incomplete item data skipped: {item_data}")
-            continue
+    item_rows = _build_item_rows(receipt_id, extracted_data.get("items") or [])
+    if item_rows:
+        db.execute(insert(ReceiptItem), item_rows)
 
-        try:
-            item = ReceiptItem(
-                receipt_id=db_receipt.id,
-                description=item_data["description"],
-                quantity=float(item_data.get("quantity") or 0.0),
-                price=float(item_data.get("price") or 0.0),
+    index_receipt(
+        db,
+        receipt_id=receipt_id,
+        merchant_name=db_receipt.merchant_name,
+        item_descriptions=[row["description"] for row in item_rows],
+        ocr_text=ocr_text,
+    )
+    apply_spend_delta(
+        db,
+        merchant_name=db_receipt.merchant_name,
+        # Without a purchase date, bucket on the server-set created_at (loaded on access)
+        day=spend_day(parsed_date, None if parsed_date else db_receipt.created_at),
+        receipt_count=1,
+        total_amount=db_receipt.total_amount,
+        item_count=len(item_rows),
+        item_price_total=sum(row["price"] for row in item_rows),
+    )
+    return receipt_id
+
+
+def _delete_receipts_for_file(db: Session, file_id: int) -> None:
+    """
+    Deletes a file's receipts and items, and removes them from the search index
+    and (with negative deltas) the spend summary.
+    """
+    receipts = db.execute(
+        select(
+            Receipt.id,
+            Receipt.merchant_name,
+            Receipt.purchased_at,
+            Receipt.created_at,
+            Receipt.total_amount,
+            func.count(ReceiptItem.id).label("item_count"),
+            func.coalesce(func.sum(ReceiptItem.price), 0.0).label("item_price_total"),
+        )
+        .outerjoin(ReceiptItem, ReceiptItem.receipt_id == Receipt.id)
+        .where(Receipt.receipt_file_id == file_id)
+        .group_by(Receipt.id)
+    ).all()
+
+    for row in receipts:
+        remove_from_index(db, receipt_id=row.id)
+        apply_spend_delta(
+            db,
+            merchant_name=row.merchant_name,
+            day=spend_day(row.purchased_at, row.created_at),
+            receipt_count=-1,
+            total_amount=-(row.total_amount or 0.0),
+            item_count=-row.item_count,
+            item_price_total=-row.item_price_total,
+        )
+
+    receipt_ids = [row.id for row in receipts]
+    _track_changed_receipts(db, receipt_ids)
+    if receipt_ids:
+        db.execute(delete(ReceiptItem).where(ReceiptItem.receipt_id.in_(receipt_ids)))
+        db.execute(delete(Receipt).where(Receipt.id.in_(receipt_ids)))
+
+
+def create_receipt_and_items(
+        db: Session,
+        extracted_data: dict[str, Any],
+        file_id: int,
+        ocr_text: str | None = None,
+        commit: bool = True,
+        lease_owner: str | None = None,
+) -> int:
+    """
+    Stores an extracted receipt in a single transaction: inserts the receipt,
+    bulk-inserts its items, adds it to the search index (with `ocr_text`, if given)
+    and the spend summary, and marks the source file as processed.
+    With `commit=False` the writes are only flushed, so callers can batch several
+    receipts into one transaction. With `lease_owner`, the file is only marked
+    processed if that worker still holds its processing lease.
+
+    Returns:
+        int: ID of the new receipt.
+
+    Raises:
+        ValueError: If the file does not exist, was already processed or the lease was lost; nothing is written.
+    """
+    try:
+        receipt_id = _insert_receipt(db, extracted_data, file_id, ocr_text=ocr_text)
+
+        statement = update(ReceiptFile).where(ReceiptFile.id == file_id, ReceiptFile.is_processed.is_(False))
+        if lease_owner is not None:
+            statement = statement.where(ReceiptFile.lease_owner == lease_owner)
+        result = db.execute(
+            statement.values(
+                is_processed=True,
+                status=ProcessingStatus.DONE.value,
+                lease_owner=None,
+                lease_expires_at=None,
+                last_error=None,
             )
-            db.add(item)
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid item: {item_data} | Error: {e}")
-            continue
+        )
+        if result.rowcount != 1:
+            raise ValueError("File not found, already processed, or its processing lease was lost.")
+
+        if commit:
+            db.commit()
+    except Exception:
+        if commit:
+            db.rollback()
+        raise
+
+    return receipt_id
+
+
+def replace_receipt(
+        db: Session,
+        extracted_data: dict[str, Any],
+        file_id: int,
+        lease_owner: str,
+        ocr_text: str | None = None,
+) -> int:
+    """
+    Replaces the receipt of an already processed file with a new extraction, in a
+    single transaction. The old receipt's spend is subtracted from the summary and
+    it is removed from the search index before the new one is added. Only applied
+    if `lease_owner` still holds the file's processing lease.
+
+    Returns:
+        int: ID of the new receipt.
+
+    Raises:
+        ValueError: If the file is not processed or the lease was lost; nothing is written.
+    """
+    try:
+        _delete_receipts_for_file(db, file_id)
+        receipt_id = _insert_receipt(db, extracted_data, file_id, ocr_text=ocr_text)
+
+        result = db.execute(
+            update(ReceiptFile)
+            .where(
+                ReceiptFile.id == file_id,
+                ReceiptFile.is_processed.is_(True),
+                ReceiptFile.lease_owner == lease_owner,
+            )
+            .values(status=ProcessingStatus.DONE.value, lease_owner=None, lease_expires_at=None, last_error=None)
+        )
+        if result.rowcount != 1:
+            raise ValueError("File not found, not processed, or its processing lease was lost.")
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
-    db.commit()
-    db.refresh(db_receipt)
-    return db_receipt
+    return receipt_id
@@ -1,13 +1,25 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.orm import Session
 
-from app.models import ReceiptFile
+from app.models import ProcessingStatus, ReceiptFile, ReceiptPage
 
 
-def create_receipt_file(db: Session, file_name: str, file_path: str) -> ReceiptFile:
-    db_file = ReceiptFile(file_name=file_name, file_path=file_path)
+def create_receipt_file(
+        db: Session,
+        file_name: str,
+        file_path: str,
+        content_hash: str | None = None,
+        commit: bool = True,
+) -> ReceiptFile:
+    db_file = ReceiptFile(file_name=file_name, file_path=file_path, content_hash=content_hash)
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    if commit:
+        db.commit()
+        db.refresh(db_file)
+    else:
+        db.flush()
     return db_file
 
 
@@ -15,20 +27,391 @@ def get_receipt_file(db: Session, file_id: int) -> ReceiptFile | None:
     return db.query(ReceiptFile).filter(ReceiptFile.id == file_id).first()
 
 
-def update_validation_status(db: Session, file_id: int, is_valid: bool, reason: str = "") -> ReceiptFile | None:
+def get_receipt_file_by_hash(db: Session, content_hash: str) -> ReceiptFile | None:
+    return db.query(ReceiptFile).filter(ReceiptFile.content_hash == content_hash).first()
+
+
+def update_validation_status(
+        db: Session,
+        file_id: int,
+        is_valid: bool,
+        reason: str = "",
+        commit: bool = True,
+) -> ReceiptFile | None:
     db_file = get_receipt_file(db, file_id)
     if db_file:
         db_file.is_valid = is_valid
         db_file.invalid_reason = reason
-        db.commit()
-        db.refresh(db_file)
+        if commit:
+            db.commit()
+            db.refresh(db_file)
+        else:
+            db.flush()
     return db_file
 
 
-def mark_as_processed(db: Session, file_id: int) -> ReceiptFile | None:
-    db_file = get_receipt_file(db, file_id)
-    if db_file:
-        db_file.is_processed = True
-        db.commit()
-        db.refresh(db_file)
-    return db_file
+# ----------------------------------------
+# Processing State Machine
+# ----------------------------------------
+
+# A file moves NULL -> queued -> running -> done, or to failed. Every transition is a
+# single conditional UPDATE, so concurrent workers (threads, processes or replicas
+# sharing the database) can never both win the same transition. Each one commits
+# straight away, so in-session objects are simply expired rather than synchronized.
+# Both states carry a lease: queued files are leased by the process holding them in
+# memory, running ones by the worker processing them.
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_expired(now: datetime):
+    return and_(ReceiptFile.status == ProcessingStatus.RUNNING.value, ReceiptFile.lease_expires_at < now)
+
+
+def _queue_lease_lapsed(now: datetime):
+    # Queued by a process that stopped renewing its lease, or by one that never took a lease
+    return and_(
+        ReceiptFile.status == ProcessingStatus.QUEUED.value,
+        or_(ReceiptFile.lease_expires_at.is_(None), ReceiptFile.lease_expires_at < now),
+    )
+
+
+def enqueue_receipt_file(
+        db: Session,
+        file_id: int,
+        queue_owner: str | None = None,
+        lease_seconds: int | None = None,
+) -> bool:
+    """
+    Marks a validated, unprocessed file as queued. With `queue_owner`, the process
+    that holds the file in its in-memory queue takes a lease on it for `lease_seconds`
+    and must keep renewing it (`renew_queued_leases`); once it lapses, other processes
+    treat the file as abandoned.
+
+    Returns:
+        bool: False if the file is already queued, running under a live lease, or done.
+    """
+    now = _utcnow()
+    result = db.execute(
+        update(ReceiptFile)
+        .where(
+            ReceiptFile.id == file_id,
+            ReceiptFile.is_valid.is_(True),
+            ReceiptFile.is_processed.is_(False),
+            or_(
+                ReceiptFile.status.is_(None),
+                ReceiptFile.status == ProcessingStatus.FAILED.value,
+                _lease_expired(now),
+            ),
+        )
+        .values(
+            status=ProcessingStatus.QUEUED.value,
+            lease_owner=queue_owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds) if queue_owner is not None else None,
+            last_error=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def claim_receipt_file(db: Session, file_id: int, lease_owner: str, lease_seconds: int, max_attempts: int) -> bool:
+    """
+    Atomically takes a lease on a queued file, or on a running one whose lease has
+    expired (its worker crashed) and that has attempts left.
+
+    Returns:
+        bool: True if `lease_owner` now holds the lease and may process the file.
+    """
+    now = _utcnow()
+    result = db.execute(
+        update(ReceiptFile)
+        .where(
+            ReceiptFile.id == file_id,
+            ReceiptFile.is_processed.is_(False),
+            or_(
+                ReceiptFile.status == ProcessingStatus.QUEUED.value,
+                and_(_lease_expired(now), ReceiptFile.attempts < max_attempts),
+            ),
+        )
+        .values(
+            status=ProcessingStatus.RUNNING.value,
+            lease_owner=lease_owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=ReceiptFile.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def renew_lease(db: Session, file_id: int, lease_owner: str, lease_seconds: int) -> bool:
+    """
+    Extends a lease still held by `lease_owner`.
+
+    Returns:
+        bool: False if the lease was lost to another worker.
+    """
+    result = db.execute(
+        update(ReceiptFile)
+        .where(
+            ReceiptFile.id == file_id,
+            ReceiptFile.status == ProcessingStatus.RUNNING.value,
+            ReceiptFile.lease_owner == lease_owner,
+        )
+        .values(lease_expires_at=_utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def fail_receipt_file(db: Session, file_id: int, error: str, lease_owner: str | None = None) -> bool:
+    """
+    Marks a file as failed. With `lease_owner`, only if that worker still holds the
+    lease; without it, only if the file is still waiting in the queue.
+    """
+    if lease_owner is not None:
+        fence = and_(ReceiptFile.status == ProcessingStatus.RUNNING.value, ReceiptFile.lease_owner == lease_owner)
+    else:
+        fence = ReceiptFile.status == ProcessingStatus.QUEUED.value
+    result = db.execute(
+        update(ReceiptFile)
+        .where(ReceiptFile.id == file_id, fence)
+        .values(status=ProcessingStatus.FAILED.value, lease_owner=None, lease_expires_at=None, last_error=error)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def claim_for_reextract(db: Session, file_id: int, lease_owner: str, lease_seconds: int) -> bool:
+    """
+    Atomically takes a lease on a processed file so its receipt can be re-extracted.
+    Fails while another worker holds a live lease on the file.
+
+    Returns:
+        bool: True if `lease_owner` now holds the lease.
+    """
+    now = _utcnow()
+    result = db.execute(
+        update(ReceiptFile)
+        .where(
+            ReceiptFile.id == file_id,
+            ReceiptFile.is_processed.is_(True),
+            or_(
+                ReceiptFile.status.is_(None),
+                ReceiptFile.status != ProcessingStatus.RUNNING.value,
+                ReceiptFile.lease_expires_at < now,
+            ),
+        )
+        .values(
+            status=ProcessingStatus.RUNNING.value,
+            lease_owner=lease_owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def fail_exhausted_leases(db: Session, max_attempts: int) -> int:
+    """
+    Fails files whose lease expired and that will not be retried: those on their
+    last allowed attempt, and abandoned re-extractions of processed files.
+
+    Returns:
+        int: Number of files marked as failed.
+    """
+    result = db.execute(
+        update(ReceiptFile)
+        .where(
+            _lease_expired(_utcnow()),
+            or_(ReceiptFile.attempts >= max_attempts, ReceiptFile.is_processed.is_(True)),
+        )
+        .values(
+            status=ProcessingStatus.FAILED.value,
+            lease_owner=None,
+            lease_expires_at=None,
+            last_error="Processing lease expired and will not be retried.",
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def renew_queued_leases(db: Session, queue_owner: str, lease_seconds: int) -> int:
+    """
+    Extends the leases on every file `queue_owner` still has queued.
+
+    Returns:
+        int: Number of leases renewed.
+    """
+    result = db.execute(
+        update(ReceiptFile)
+        .where(ReceiptFile.status == ProcessingStatus.QUEUED.value, ReceiptFile.lease_owner == queue_owner)
+        .values(lease_expires_at=_utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def release_queued_leases(db: Session, queue_owner: str, file_id: int | None = None) -> int:
+    """
+    Drops the leases on files `queue_owner` has queued (or just `file_id`), so another
+    process picks them up on its next sweep. The files stay queued.
+
+    Returns:
+        int: Number of leases released.
+    """
+    statement = update(ReceiptFile).where(
+        ReceiptFile.status == ProcessingStatus.QUEUED.value, ReceiptFile.lease_owner == queue_owner
+    )
+    if file_id is not None:
+        statement = statement.where(ReceiptFile.id == file_id)
+    result = db.execute(
+        statement.values(lease_owner=None, lease_expires_at=None).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def get_stale_receipt_file_ids(db: Session) -> list[int]:
+    """
+    Returns unprocessed files that were abandoned: running under an expired lease (their
+    worker died) or queued by a process whose queue lease lapsed (it exited or hung).
+    Files queued or running in live processes are not returned.
+    """
+    now = _utcnow()
+    condition = and_(ReceiptFile.is_processed.is_(False), or_(_lease_expired(now), _queue_lease_lapsed(now)))
+    return list(db.scalars(select(ReceiptFile.id).where(condition).order_by(ReceiptFile.id)))
+
+
+def requeue_stale_receipt_file(
+        db: Session,
+        file_id: int,
+        queue_owner: str,
+        lease_seconds: int,
+        max_attempts: int,
+) -> bool:
+    """
+    Atomically takes over an abandoned file (see `get_stale_receipt_file_ids`) that has
+    attempts left, queuing it under `queue_owner`. The previous worker's lease is replaced,
+    so it can no longer store a result.
+
+    Returns:
+        bool: True if `queue_owner` should now submit the file; False if another process took it over first.
+    """
+    now = _utcnow()
+    result = db.execute(
+        update(ReceiptFile)
+        .where(
+            ReceiptFile.id == file_id,
+            ReceiptFile.is_processed.is_(False),
+            or_(and_(_lease_expired(now), ReceiptFile.attempts < max_attempts), _queue_lease_lapsed(now)),
+        )
+        .values(
+            status=ProcessingStatus.QUEUED.value,
+            lease_owner=queue_owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+# ----------------------------------------
+# Retention
+# ----------------------------------------
+
+# The retention job deletes stored files, never records: receipts, pages and the file
+# row stay, with `purged_at` set. Like the state machine, marking a file purged is a
+# conditional UPDATE, so only one of several concurrent retention runs deletes it.
+
+def get_purgeable_receipt_files(
+        db: Session,
+        invalid_before: datetime | None,
+        processed_before: datetime | None,
+        after_id: int = 0,
+        limit: int = 500,
+) -> list[tuple[int, str]]:
+    """
+    Returns (id, file_path) of files whose stored copy may be deleted: invalid files
+    last updated before `invalid_before`, and processed files last updated before
+    `processed_before` that have their page text stored (so they can still be re-extracted)
+    and are not leased. A None cutoff disables that rule. Results are in id order,
+    starting after `after_id`.
+    """
+    last_updated = func.coalesce(ReceiptFile.updated_at, ReceiptFile.created_at)
+    rules = []
+    if invalid_before is not None:
+        rules.append(and_(ReceiptFile.is_valid.is_(False), last_updated < invalid_before))
+    if processed_before is not None:
+        rules.append(and_(
+            ReceiptFile.is_processed.is_(True),
+            ReceiptFile.lease_owner.is_(None),
+            last_updated < processed_before,
+            select(ReceiptPage.id).where(ReceiptPage.receipt_file_id == ReceiptFile.id).exists(),
+        ))
+    if not rules:
+        return []
+
+    query = (
+        select(ReceiptFile.id, ReceiptFile.file_path)
+        .where(ReceiptFile.id > after_id, ReceiptFile.purged_at.is_(None), or_(*rules))
+        .order_by(ReceiptFile.id)
+        .limit(limit)
+    )
+    return [tuple(row) for row in db.execute(query)]
+
+
+def mark_purged(db: Session, file_id: int) -> bool:
+    """
+    Records that the stored file is being deleted. Returns False if another run got there first
+    or the file was leased for processing in the meantime; only the caller that gets True deletes it.
+    """
+    result = db.execute(
+        update(ReceiptFile)
+        .where(ReceiptFile.id == file_id, ReceiptFile.purged_at.is_(None), ReceiptFile.lease_owner.is_(None))
+        .values(purged_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def confirm_purged(db: Session, file_id: int, file_path: str) -> bool:
+    """
+    Checks, after the stored file was moved out of the way, that the file is still marked
+    purged with the same path. Returns False if the same content was uploaded again in the
+    meantime and the record restored, in which case the file must be kept. The check is a
+    conditional UPDATE, so it waits for and is ordered with a concurrent restore.
+    """
+    result = db.execute(
+        update(ReceiptFile)
+        .where(ReceiptFile.id == file_id, ReceiptFile.purged_at.is_not(None), ReceiptFile.file_path == file_path)
+        .values(purged_at=ReceiptFile.purged_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def restore_receipt_file(db: Session, file_id: int, file_path: str) -> None:
+    """
+    Points a purged file at a new stored copy after the same content was uploaded again.
+    """
+    db.execute(
+        update(ReceiptFile)
+        .where(ReceiptFile.id == file_id)
+        .values(file_path=file_path, purged_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
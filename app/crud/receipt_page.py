@@ -0,0 +1,96 @@
+from typing import Any
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import ProcessingStatus, ReceiptFile, ReceiptPage
+
+
+def save_receipt_pages(
+        db: Session,
+        file_id: int,
+        pages: list[dict[str, Any]],
+        commit: bool = True,
+        lease_owner: str | None = None,
+) -> None:
+    """
+    Stores the extracted pages of a file (as returned by `ocr_service.extract_pages`),
+    replacing any pages stored earlier. With `lease_owner`, the pages are only stored
+    if that worker still holds the file's processing lease.
+
+    Raises:
+        ValueError: If the lease was lost; nothing is written.
+    """
+    try:
+        if lease_owner is not None:
+            # A no-op update that locks the file row for the rest of the transaction
+            result = db.execute(
+                update(ReceiptFile)
+                .where(
+                    ReceiptFile.id == file_id,
+                    ReceiptFile.status == ProcessingStatus.RUNNING.value,
+                    ReceiptFile.lease_owner == lease_owner,
+                )
+                .values(lease_owner=lease_owner)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise ValueError("The processing lease was lost to another worker.")
+
+        db.execute(delete(ReceiptPage).where(ReceiptPage.receipt_file_id == file_id))
+        if pages:
+            db.execute(insert(ReceiptPage), [
+                {
+                    "receipt_file_id": file_id,
+                    "page_number": page["page"],
+                    "text": page["text"] or "",
+                    "source": page["source"],
+                    "engine": page["engine"],
+                    "duration_ms": page.get("duration_ms"),
+                    "error": page["error"],
+                }
+                for page in pages
+            ])
+        if commit:
+            db.commit()
+    except Exception:
+        if commit:
+            db.rollback()
+        raise
+
+
+def get_receipt_pages(db: Session, file_id: int) -> list[dict[str, Any]]:
+    """
+    Returns the stored pages of a file in page order, in the same shape as
+    `ocr_service.extract_pages`, or an empty list if none were stored.
+    """
+    rows = db.execute(
+        select(
+            ReceiptPage.page_number.label("page"),
+            ReceiptPage.text,
+            ReceiptPage.error,
+            ReceiptPage.source,
+            ReceiptPage.engine,
+            ReceiptPage.duration_ms,
+        )
+        .where(ReceiptPage.receipt_file_id == file_id)
+        .order_by(ReceiptPage.page_number)
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def get_reextractable_file_ids(db: Session, file_ids: list[int] | None = None) -> list[int]:
+    """
+    Returns processed files that have stored pages, optionally limited to `file_ids`.
+    """
+    query = (
+        select(ReceiptFile.id)
+        .where(
+            ReceiptFile.is_processed.is_(True),
+            select(ReceiptPage.id).where(ReceiptPage.receipt_file_id == ReceiptFile.id).exists(),
+        )
+        .order_by(ReceiptFile.id)
+    )
+    if file_ids is not None:
+        query = query.where(ReceiptFile.id.in_(file_ids))
+    return list(db.scalars(query))
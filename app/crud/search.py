@@ -0,0 +1,173 @@
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, noload, selectinload
+
+from app.core.database import IS_SQLITE
+from app.models import Receipt
+from utils.logging import log
+
+logger = log(__name__)
+
+# ----------------------------------------
+# Full-Text Search (SQLite FTS5)
+# ----------------------------------------
+
+# `receipt_search` indexes merchant names, item descriptions and (optionally) raw OCR
+# text with rowid = receipt.id. `receipt_merchant_trigram` indexes merchant names as
+# trigrams so that misspelled merchant names can still be matched.
+_CREATE_SEARCH_TABLES = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS receipt_search USING fts5(
+        merchant_name, items, ocr_text, tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS receipt_merchant_trigram USING fts5(
+        merchant_name, tokenize='trigram'
+    )
+    """,
+]
+
+_BACKFILL_SEARCH_TABLES = [
+    """
+    INSERT INTO receipt_search(rowid, merchant_name, items, ocr_text)
+    SELECT r.id, coalesce(r.merchant_name, ''), coalesce(group_concat(i.description, '\n'), ''), ''
+    FROM receipt r LEFT JOIN receipt_item i ON i.receipt_id = r.id
+    GROUP BY r.id
+    """,
+    """
+    INSERT INTO receipt_merchant_trigram(rowid, merchant_name)
+    SELECT id, merchant_name FROM receipt WHERE merchant_name IS NOT NULL
+    """,
+]
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Creates the FTS5 tables if missing and fills them from existing receipts.
+    No-op on databases other than SQLite.
+    """
+    if not IS_SQLITE:
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'receipt_search'")
+        ).first()
+        if exists:
+            return
+        logger.info("Creating full-text search index...")
+        for statement in _CREATE_SEARCH_TABLES + _BACKFILL_SEARCH_TABLES:
+            conn.execute(text(statement))
+
+
+def index_receipt(
+        db: Session,
+        receipt_id: int,
+        merchant_name: str | None,
+        item_descriptions: list[str],
+        ocr_text: str | None = None,
+) -> None:
+    """
+    Adds a receipt to the search index inside the caller's transaction.
+    """
+    if not IS_SQLITE:
+        return
+    db.execute(
+        text(
+            "INSERT INTO receipt_search(rowid, merchant_name, items, ocr_text) "
+            "VALUES (:id, :merchant_name, :items, :ocr_text)"
+        ),
+        {
+            "id": receipt_id,
+            "merchant_name": merchant_name or "",
+            "items": "\n".join(item_descriptions),
+            "ocr_text": ocr_text or "",
+        },
+    )
+    if merchant_name:
+        db.execute(
+            text("INSERT INTO receipt_merchant_trigram(rowid, merchant_name) VALUES (:id, :merchant_name)"),
+            {"id": receipt_id, "merchant_name": merchant_name},
+        )
+
+
+def remove_from_index(db: Session, receipt_id: int) -> None:
+    """
+    Removes a receipt from the search index inside the caller's transaction.
+    """
+    if not IS_SQLITE:
+        return
+    db.execute(text("DELETE FROM receipt_search WHERE rowid = :id"), {"id": receipt_id})
+    db.execute(text("DELETE FROM receipt_merchant_trigram WHERE rowid = :id"), {"id": receipt_id})
+
+
+def _match_query(query: str) -> str:
+    """
+    Every word must match, each as a prefix: 'blue ton' -> '"blue"* "ton"*'.
+    """
+    return " ".join(f'"{term}"*' for term in _TERM.findall(query))
+
+
+def _trigram_query(query: str) -> str:
+    """
+    Any trigram of any word may match; bm25 ranks names sharing more trigrams first.
+    """
+    grams = {
+        word[i:i + 3]
+        for word in _TERM.findall(query.lower())
+        for i in range(len(word) - 2)
+    }
+    return " OR ".join(f'"{gram}"' for gram in sorted(grams))
+
+
+def search_receipt_ids(db: Session, query: str, limit: int = 20, fuzzy: bool = False) -> list[int]:
+    """
+    Returns receipt IDs matching `query`, best match first.
+    With `fuzzy`, merchant names sharing trigrams with the query are appended
+    after the exact/prefix matches.
+    """
+    ids: list[int] = []
+    match = _match_query(query)
+    if match:
+        ids = list(db.execute(
+            text("SELECT rowid FROM receipt_search WHERE receipt_search MATCH :q ORDER BY rank LIMIT :limit"),
+            {"q": match, "limit": limit},
+        ).scalars())
+
+    trigram_match = _trigram_query(query) if fuzzy else ""
+    if trigram_match and len(ids) < limit:
+        seen = set(ids)
+        fuzzy_ids = db.execute(
+            text(
+                "SELECT rowid FROM receipt_merchant_trigram WHERE receipt_merchant_trigram MATCH :q "
+                "ORDER BY rank LIMIT :limit"
+            ),
+            {"q": trigram_match, "limit": limit},
+        ).scalars()
+        ids.extend(i for i in fuzzy_ids if i not in seen)
+
+    return ids[:limit]
+
+
+def search_receipts(
+        db: Session,
+        query: str,
+        limit: int = 20,
+        fuzzy: bool = False,
+        include_items: bool = True,
+) -> list[Receipt]:
+    ids = search_receipt_ids(db, query, limit=limit, fuzzy=fuzzy)
+    if not ids:
+        return []
+    receipts = (
+        db.query(Receipt)
+        .options(selectinload(Receipt.items) if include_items else noload(Receipt.items))
+        .filter(Receipt.id.in_(ids))
+        .all()
+    )
+    by_id = {r.id: r for r in receipts}
+    return [by_id[i] for i in ids if i in by_id]
@@ -1,28 +1,109 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.api import routes
-from app.core.database import engine
-from app.models import Base
+from app.core.database import AsyncBackedSession, DB_CREATE_TABLES, SessionLocal, async_engine, engine
+from app.core.metrics import HTTP_REQUEST_SECONDS, instrument_sessions
+from app.core.migrations import init_database
+from app.core.services import services
+from app.services.llm_cache import llm_cache
+from app.services.pipeline import job_queue, recover_stale_jobs, reextract_queue, release_queued_jobs
+from app.services.receipt_cache import receipt_cache
+from app.services.retention import retention_scheduler
 from utils.logging import log
 
 logger = log(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup creates or upgrades the tables and starts the background workers. Shared
+    services (LLM client, OCR and validation pools) are not created here but on
+    first use. On shutdown the workers finish their current jobs (jobs still
+    waiting stay queued in the database) and, once they have exited, whatever
+    services were created are closed.
+    """
+    if DB_CREATE_TABLES:
+        logger.info("Starting up: Creating or upgrading tables...")
+        init_database(engine)
+    job_queue.start()
+    reextract_queue.start()
+    recover_stale_jobs()
+    retention_scheduler.start()
+
+    yield
+
+    logger.info("Shutting down: Stopping processing workers...")
+    retention_scheduler.stop(timeout=30)
+    stopped = [job_queue.stop(timeout=30), reextract_queue.stop(timeout=30)]
+    released = release_queued_jobs()
+    if released:
+        logger.info(f"Released {released} queued file(s) to other processes.")
+    if llm_cache:
+        llm_cache.flush()
+    if all(stopped):
+        services.close()
+    else:
+        # Closing the pools or the LLM client under a running job would fail it
+        logger.warning("Workers did not exit in time; leaving shared services to process exit.")
+    await async_engine.dispose()
+
+
 # Create the FastAPI app instance
 app = FastAPI(
     title="ReceiptIQ API",
     description="API for processing scanned receipts.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
+# Sync sessions (background workers) and the sessions behind AsyncSessionLocal (routes)
+for session_factory in (SessionLocal, AsyncBackedSession):
+    instrument_sessions(session_factory)
+    if receipt_cache:
+        receipt_cache.attach(session_factory)
 
 
-@app.on_event("startup")
-def startup_event():
+class RequestLatencyMiddleware:
     """
-    Startup logic to initialize database tables.
-    Ensures all models are imported and tables created if missing.
+    Records the latency of every request, labelled by route template so that
+    path parameters (e.g. receipt IDs) do not create a series per value.
+
+    Plain ASGI rather than `@app.middleware("http")`: that wrapper re-streams the
+    response body and would reject the path-send messages of file downloads.
     """
-    logger.info("Starting up: Creating tables if not exist...")
-    Base.metadata.create_all(bind=engine)
 
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], route.path if route else "unmatched", str(status)
+            ).observe(time.perf_counter() - started)
+
+
+app.add_middleware(RequestLatencyMiddleware)
 
 app.include_router(routes.router)
 
@@ -30,3 +111,11 @@ app.include_router(routes.router)
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "Welcome to the Receipt API. Go to /docs for API documentation."}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus metrics for this process.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,19 @@
 from app.core.database import Base
 
+from app.models.llm_cache_entry import LLMCacheEntry
 from app.models.receipt import Receipt
-from app.models.receipt_file import ReceiptFile
+from app.models.receipt_file import ProcessingStatus, ReceiptFile
 from app.models.receipt_item import ReceiptItem
+from app.models.receipt_page import ReceiptPage
+from app.models.spend_summary import SpendSummary
 
-__all__ = ["Base", "Receipt", "ReceiptFile", "ReceiptItem"]
+__all__ = [
+    "Base",
+    "LLMCacheEntry",
+    "ProcessingStatus",
+    "Receipt",
+    "ReceiptFile",
+    "ReceiptItem",
+    "ReceiptPage",
+    "SpendSummary",
+]
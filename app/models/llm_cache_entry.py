@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = 'llm_cache_entry'
+
+    key = Column(String(64), primary_key=True)  # SHA-256 of normalized text + model + prompt version
+    model_id = Column(String, nullable=True)
+    prompt_version = Column(String, nullable=False)
+    response = Column(Text, nullable=False)  # Parsed LLM output as JSON
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -1,21 +1,34 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from app.core.database import Base
 
+# SQLite stores server-side timestamps as "YYYY-MM-DD HH:MM:SS" text. Binding values in the
+# same format keeps comparisons (e.g. keyset cursors) exact against those rows.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 
 class Receipt(Base):
     __tablename__ = 'receipt'
 
     id = Column(Integer, primary_key=True, index=True)
     receipt_file_id = Column(Integer, ForeignKey('receipt_file.id', ondelete='CASCADE'), nullable=False)
-    purchased_at = Column(DateTime, nullable=True)
+    purchased_at = Column(DateTime, nullable=True, index=True)
     merchant_name = Column(String, nullable=True)
-    total_amount = Column(Float, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    total_amount = Column(Float, nullable=True, index=True)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+    updated_at = Column(Timestamp, onupdate=func.now())
 
     # Relationships
     receipt_file = relationship("ReceiptFile", back_populates="receipts")
     items = relationship("ReceiptItem", back_populates="receipt", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_receipt_created_at_id", "created_at", "id"),  # Keyset pagination
+        Index("ix_receipt_merchant_purchased_at", "merchant_name", "purchased_at"),  # Merchant + date range
+    )
@@ -1,8 +1,18 @@
+from enum import Enum
+
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from app.core.database import Base
+from app.models.receipt import Timestamp
+
+
+class ProcessingStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
 
 
 class ReceiptFile(Base):
@@ -11,11 +21,25 @@ class ReceiptFile(Base):
     id = Column(Integer, primary_key=True, index=True)
     file_name = Column(String, nullable=False)
     file_path = Column(String, nullable=False, unique=True)
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)  # SHA-256 of file contents
     is_valid = Column(Boolean, nullable=True)
     invalid_reason = Column(String, nullable=True)
     is_processed = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Processing state machine: NULL -> queued -> running -> done | failed
+    status = Column(String(16), nullable=True, index=True)
+    lease_owner = Column(String, nullable=True)  # Token of the worker holding the current lease
+    lease_expires_at = Column(Timestamp, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+
+    # Set once the retention job has deleted the stored file; the record and its receipts remain
+    purged_at = Column(Timestamp, nullable=True)
+
     # Relationship
     receipts = relationship("Receipt", back_populates="receipt_file", cascade="all, delete-orphan")
+    pages = relationship(
+        "ReceiptPage", back_populates="receipt_file", cascade="all, delete-orphan", order_by="ReceiptPage.page_number"
+    )
@@ -8,7 +8,7 @@ class ReceiptItem(Base):
     __tablename__ = 'receipt_item'
 
     id = Column(Integer, primary_key=True, index=True)
-    receipt_id = Column(Integer, ForeignKey('receipt.id', ondelete='CASCADE'), nullable=False)
+    receipt_id = Column(Integer, ForeignKey('receipt.id', ondelete='CASCADE'), nullable=False, index=True)
     description = Column(String, nullable=False)
     quantity = Column(Float, nullable=False)
     price = Column(Float, nullable=False)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from app.core.database import Base
+
+
+class ReceiptPage(Base):
+    """
+    Extracted text of one PDF page, kept so receipts can be re-extracted
+    with a new model or prompt without rendering and OCR'ing the PDF again.
+    """
+    __tablename__ = 'receipt_page'
+
+    id = Column(Integer, primary_key=True, index=True)
+    receipt_file_id = Column(Integer, ForeignKey('receipt_file.id', ondelete='CASCADE'), nullable=False)
+    page_number = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False, default="")
+    source = Column(String(16), nullable=False)  # "text_layer" or "ocr"
+    engine = Column(String, nullable=True)  # OCR engine, for OCR'd pages
+    duration_ms = Column(Float, nullable=True)
+    error = Column(String, nullable=True)
+
+    # Relationship
+    receipt_file = relationship("ReceiptFile", back_populates="pages")
+
+    __table_args__ = (
+        UniqueConstraint("receipt_file_id", "page_number", name="uq_receipt_page_file_page"),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Float, Date
+
+from app.core.database import Base
+
+
+class SpendSummary(Base):
+    """
+    Daily spend per merchant, maintained incrementally as receipts are written.
+    Receipts without a merchant are stored under an empty merchant name.
+    """
+    __tablename__ = 'spend_summary'
+
+    merchant_name = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    receipt_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Float, default=0.0, nullable=False)
+    item_count = Column(Integer, default=0, nullable=False)
+    item_price_total = Column(Float, default=0.0, nullable=False)
@@ -1,9 +1,31 @@
+from datetime import datetime
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
 class UploadResponse(BaseModel):
     id: int
     file_name: str
+    content_hash: str
+    is_duplicate: bool = False
+    receipt_id: Optional[int] = None
+
+
+class BatchUploadItem(BaseModel):
+    file_name: str
+    status: str  # uploaded, duplicate, invalid, queued or rejected
+    id: Optional[int] = None
+    content_hash: Optional[str] = None
+    is_duplicate: bool = False
+    is_valid: Optional[bool] = None
+    receipt_id: Optional[int] = None
+    job_id: Optional[str] = None
+    message: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    files: List[BatchUploadItem]
 
 
 class ValidationRequest(BaseModel):
@@ -21,5 +43,75 @@ class ProcessRequest(BaseModel):
 
 
 class ProcessResponse(BaseModel):
-    receipt_id: int
+    job_id: str
+    file_id: int
+    status: str
     message: str
+
+
+class ReextractRequest(BaseModel):
+    file_ids: Optional[List[int]] = None  # All processed files with stored pages if omitted
+
+
+class ReextractResponse(BaseModel):
+    queued: int
+    skipped: int
+    job_ids: List[str]
+    message: Optional[str] = None
+
+
+class PageError(BaseModel):
+    page: int
+    error: str
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    file_id: int
+    status: str
+    receipt_id: Optional[int] = None
+    failed_pages: List[PageError] = []
+    text_layer_pages: int = 0
+    ocr_pages: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class FileStatusResponse(BaseModel):
+    file_id: int
+    is_valid: Optional[bool] = None
+    is_processed: bool
+    status: Optional[str] = None  # queued, running, done or failed; None if never submitted
+    attempts: int = 0
+    last_error: Optional[str] = None
+    receipt_id: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+
+class QueueStatsResponse(BaseModel):
+    queued: int
+    running: int
+    workers: int
+    max_queue_size: int
+
+
+class LLMCacheStatsResponse(BaseModel):
+    enabled: bool
+    entries: int = 0
+    max_entries: int = 0
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0.0
+
+
+class SpendSummaryRow(BaseModel):
+    merchant_name: Optional[str] = None
+    period: Optional[str] = None
+    receipt_count: int
+    total_amount: float
+    average_amount: float
+    item_count: int
+    item_price_total: float
+    average_item_price: Optional[float] = None
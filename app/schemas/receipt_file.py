@@ -15,9 +15,14 @@ class ReceiptFileCreate(ReceiptFileBase):
 
 class ReceiptFile(ReceiptFileBase):
     id: int
+    content_hash: Optional[str] = None
     is_valid: Optional[bool] = None
     invalid_reason: Optional[str] = None
     is_processed: bool = False
+    status: Optional[str] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
+    purged_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Iterator
+
+from app.core.database import SessionLocal
+from app.crud import iter_receipt_batches
+
+RECEIPT_CSV_FIELDS = [
+    "id", "receipt_file_id", "merchant_name", "purchased_at", "total_amount", "created_at", "updated_at",
+]
+ITEM_CSV_FIELDS = ["item_id", "item_description", "item_quantity", "item_price"]
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _to_ndjson(batch: list[dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(row, default=_json_default) + "\n" for row in batch).encode()
+
+
+def _to_csv(batch: list[dict[str, Any]], include_items: bool, header: bool) -> bytes:
+    """
+    One CSV row per receipt, or per item (with the receipt columns repeated) when
+    items are included. Receipts without items still get one row.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(RECEIPT_CSV_FIELDS + (ITEM_CSV_FIELDS if include_items else []))
+    for row in batch:
+        receipt_values = [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (row[field] for field in RECEIPT_CSV_FIELDS)
+        ]
+        if not include_items:
+            writer.writerow(receipt_values)
+            continue
+        for item in row["items"] or [None]:
+            item_values = [item["id"], item["description"], item["quantity"], item["price"]] if item else [None] * 4
+            writer.writerow(receipt_values + item_values)
+    return buffer.getvalue().encode()
+
+
+def export_receipts(
+        fmt: str = "ndjson",
+        since: datetime | None = None,
+        since_field: str = "created_at",
+        include_items: bool = True,
+        batch_size: int = 1000,
+) -> Iterator[bytes]:
+    """
+    Yields receipts encoded as NDJSON or CSV, one chunk per batch.
+    Opens its own session because the response is streamed after the request's
+    dependencies have been cleaned up.
+    """
+    db = SessionLocal()
+    try:
+        first = True
+        for batch in iter_receipt_batches(
+                db, since=since, since_field=since_field, include_items=include_items, batch_size=batch_size
+        ):
+            if fmt == "csv":
+                yield _to_csv(batch, include_items, header=first)
+            else:
+                yield _to_ndjson(batch)
+            first = False
+        if first and fmt == "csv":
+            yield _to_csv([], include_items, header=True)
+    finally:
+        db.close()
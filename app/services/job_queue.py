@@ -0,0 +1,241 @@
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+from app.core.metrics import FAILURES, JOB_QUEUE_DEPTH, JOB_SECONDS, JOBS, JOBS_IN_PROGRESS
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# ----------------------------------------
+# Queue Configuration
+# ----------------------------------------
+
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", "2"))
+PROCESS_QUEUE_SIZE = int(os.getenv("PROCESS_QUEUE_SIZE", "1000"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "10000"))
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class Job:
+    file_id: int
+    id: str = ""  # "<file_id>-<random hex>", so any process can map a job back to its file
+    status: JobStatus = JobStatus.QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=_utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    def __post_init__(self):
+        if not self.id:
+            self.id = f"{self.file_id}-{uuid.uuid4().hex}"
+
+
+def job_file_id(job_id: str) -> int | None:
+    """
+    Returns the file ID a job ID was issued for, or None if it is not a job ID.
+    """
+    prefix, sep, _ = job_id.partition("-")
+    return int(prefix) if sep and prefix.isdigit() else None
+
+
+class JobQueue:
+    """
+    In-process job queue drained by a fixed pool of background worker threads.
+
+    Requests only pay for `submit()`; the OCR + LLM pipeline runs on the workers,
+    so API latency does not depend on how much processing is backed up.
+    Finished jobs are kept in a bounded history so their status can be polled.
+    If `sweep` is given, it is called every `sweep_interval` seconds on a separate
+    thread (e.g. to resubmit work abandoned by a crashed process).
+    """
+
+    def __init__(
+            self,
+            handler: Callable[[int], Any],
+            workers: int = PROCESS_WORKERS,
+            max_size: int = PROCESS_QUEUE_SIZE,
+            history_size: int = JOB_HISTORY_SIZE,
+            sweep: Callable[[], Any] | None = None,
+            sweep_interval: float = 60.0,
+            name: str = "process",
+    ):
+        self.handler = handler
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self.history_size = history_size
+        self.sweep = sweep
+        self.sweep_interval = sweep_interval
+
+        self._queue: queue.Queue[Optional[Job]] = queue.Queue(maxsize=max_size)
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._sweeper: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._running = 0
+
+        JOB_QUEUE_DEPTH.labels(name).set_function(self._queue.qsize)
+        self._in_progress = JOBS_IN_PROGRESS.labels(name)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.sweep is not None and self.sweep_interval > 0:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="job-sweeper", daemon=True)
+            self._sweeper.start()
+        logger.info(f"Job queue started with {self.workers} worker(s).")
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        Stops the queue without working through its backlog: jobs that have not
+        started are discarded (their files stay queued in the database, so the
+        lease sweep of this or another process picks them up again) and each
+        worker exits once its current job is done.
+
+        Returns:
+            bool: True if every worker exited within `timeout`.
+        """
+        self._stopping.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=timeout)
+            self._sweeper = None
+        discarded = self._discard_pending()
+        if discarded:
+            logger.info(f"Discarded {discarded} queued job(s) on shutdown.")
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break  # Workers also check the stop event before each job
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        alive = [thread.name for thread in self._threads if thread.is_alive()]
+        self._threads.clear()
+        if alive:
+            logger.warning(f"Job queue workers still running after {timeout}s: {', '.join(alive)}")
+            return False
+        logger.info("Job queue stopped.")
+        return True
+
+    def _discard_pending(self) -> int:
+        discarded = 0
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return discarded
+            self._queue.task_done()
+            if job is not None:
+                with self._lock:
+                    self._jobs.pop(job.id, None)
+                discarded += 1
+
+    def submit(self, file_id: int) -> Job:
+        if self._stopping.is_set():
+            raise QueueFullError("Processing queue is shutting down.")
+        job = Job(file_id=file_id)
+        with self._lock:
+            self._remember(job)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFullError("Processing queue is full.")
+        logger.info(f"Queued job {job.id} for file_id={file_id}")
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            running = self._running
+        return {
+            "queued": self._queue.qsize(),
+            "running": running,
+            "workers": self.workers,
+            "max_queue_size": self.max_size,
+        }
+
+    def _remember(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history_size:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+                break
+            self._jobs.pop(oldest_id)
+
+    def _sweep_loop(self) -> None:
+        while not self._stopping.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Job sweep failed")
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None or self._stopping.is_set():
+                self._queue.task_done()
+                if job is None:
+                    return
+                with self._lock:
+                    self._jobs.pop(job.id, None)
+                continue
+
+            with self._lock:
+                self._running += 1
+            self._in_progress.inc()
+            job.status = JobStatus.RUNNING
+            job.started_at = _utcnow()
+            try:
+                job.result = self.handler(job.file_id)
+                job.status = JobStatus.SUCCEEDED
+                logger.info(f"Job {job.id} succeeded for file_id={job.file_id}")
+            except Exception as e:
+                job.error = str(e)
+                job.status = JobStatus.FAILED
+                FAILURES.labels("job").inc()
+                logger.exception(f"Job {job.id} failed for file_id={job.file_id}")
+            finally:
+                job.finished_at = _utcnow()
+                with self._lock:
+                    self._running -= 1
+                self._in_progress.dec()
+                JOBS.labels(self.name, job.status.value).inc()
+                JOB_SECONDS.labels(self.name).observe((job.finished_at - job.started_at).total_seconds())
+                self._queue.task_done()
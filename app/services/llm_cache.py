@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+from typing import Any
+
+from dotenv import load_dotenv
+
+from app.core.database import SessionLocal
+from app.core.metrics import LLM_CACHE_REQUESTS, counter_value
+from app.crud import (
+    count_llm_cache_entries,
+    evict_llm_cache_entries,
+    get_llm_cache_entry,
+    put_llm_cache_entry,
+    touch_llm_cache_entries,
+)
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# ----------------------------------------
+# Cache Configuration
+# ----------------------------------------
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+# Hits are recorded in batches: once this many are pending, or after LLM_CACHE_TOUCH_INTERVAL seconds
+LLM_CACHE_TOUCH_BATCH = int(os.getenv("LLM_CACHE_TOUCH_BATCH", "100"))
+LLM_CACHE_TOUCH_INTERVAL = float(os.getenv("LLM_CACHE_TOUCH_INTERVAL", "60"))
+
+_WHITESPACE = re.compile(r"[ \t\f\v\r]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes OCR text so that trivially different scans of the same receipt
+    (unicode forms, spacing, blank lines) map to the same cache key.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _BLANK_LINES.sub("\n", text)
+    return "\n".join(line.strip() for line in text.strip().split("\n"))
+
+
+class LLMCache:
+    """
+    Database-backed cache of LLM extraction results.
+
+    Entries are keyed by a hash of the normalized OCR text, the model ID and the
+    prompt version, so changing either invalidates old results. The table is
+    kept below `max_entries` by evicting the least recently used entries.
+
+    Lookups only read. Hits are collected in memory and written back in one
+    statement per batch, so recency is approximate by up to one batch. Eviction
+    runs when a per-process estimate of the table size crosses `max_entries`,
+    and then trims the table to 90% of it, so most writes skip the row count.
+    """
+
+    def __init__(
+            self,
+            session_factory=SessionLocal,
+            max_entries: int = LLM_CACHE_MAX_ENTRIES,
+            touch_batch: int = LLM_CACHE_TOUCH_BATCH,
+            touch_interval: float = LLM_CACHE_TOUCH_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self.touch_interval = touch_interval
+        self._touches: dict[str, tuple[int, datetime]] = {}
+        self._pending_hits = 0
+        self._touched_at = time.monotonic()
+        self._entries: int | None = None  # Estimated table size; counted on the first write
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(raw_text: str, model_id: str | None, prompt_version: str) -> str:
+        payload = "\x00".join([model_id or "", prompt_version, normalize_text(raw_text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        db = self.session_factory()
+        try:
+            entry = get_llm_cache_entry(db, key)
+            value = json.loads(entry.response) if entry is not None else None
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            return None
+        finally:
+            db.close()
+
+        LLM_CACHE_REQUESTS.labels("miss" if value is None else "hit").inc()
+        if value is not None:
+            self._touch(key)
+        return value
+
+    def set(self, key: str, model_id: str | None, prompt_version: str, value: dict[str, Any]) -> None:
+        db = self.session_factory()
+        try:
+            put_llm_cache_entry(db, key, model_id, prompt_version, json.dumps(value))
+            with self._lock:
+                if self._entries is None:
+                    self._entries = count_llm_cache_entries(db)
+                else:
+                    self._entries += 1  # May overcount replaced entries; eviction recounts
+                evict = self._entries > self.max_entries
+                if evict:
+                    self._entries = None
+            if evict:
+                evicted = evict_llm_cache_entries(db, self.max_entries - self.max_entries // 10)
+                if evicted:
+                    logger.info(f"Evicted {evicted} LLM cache entries.")
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"LLM cache write failed: {e}")
+        finally:
+            db.close()
+
+    def flush(self) -> None:
+        """
+        Writes pending hit counts and last-used times to the database.
+        """
+        with self._lock:
+            touches, self._touches = self._touches, {}
+            self._pending_hits = 0
+            self._touched_at = time.monotonic()
+        if not touches:
+            return
+        db = self.session_factory()
+        try:
+            touch_llm_cache_entries(db, touches)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"LLM cache hit update failed: {e}")
+        finally:
+            db.close()
+
+    def stats(self, entries: int) -> dict[str, Any]:
+        """
+        Hit and miss counts of this process, with `entries` (the table size, counted
+        by the caller on its own session) and the configured limit.
+        """
+        hits = int(counter_value(LLM_CACHE_REQUESTS, result="hit"))
+        misses = int(counter_value(LLM_CACHE_REQUESTS, result="miss"))
+        total = hits + misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            hits, _ = self._touches.get(key, (0, None))
+            self._touches[key] = (hits + 1, datetime.now(timezone.utc))
+            self._pending_hits += 1
+            due = (
+                self._pending_hits >= self.touch_batch
+                or time.monotonic() - self._touched_at >= self.touch_interval
+            )
+        if due:
+            self.flush()
+
+
+# Shared cache used by the extraction pipeline; None when disabled.
+llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
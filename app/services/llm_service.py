@@ -1,36 +1,110 @@
+import asyncio
 import json
 import os
-from typing import Any, Optional
+import random
+import threading
+from typing import TYPE_CHECKING, Any, Awaitable, Optional, TypeVar
 
+import openai
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 
+from app.core.metrics import FAILURES, LLM_IN_PROGRESS, LLM_TOKENS, time_stage
+from app.services.rate_limiter import TokenBucket
 from utils.logging import log
 
+if TYPE_CHECKING:
+    from app.services.llm_cache import LLMCache
+
 logger = log(__name__)
 load_dotenv()
 
+# ----------------------------------------
+# LLM Client Configuration
+# ----------------------------------------
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # 0 = unlimited
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # 0 = unlimited
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1024"))  # Used to estimate token cost
+
+T = TypeVar("T")
+
+
+class _LoopThread:
+    """
+    A private event loop on a daemon thread.
+
+    All LLM calls run on this one loop, so the concurrency limit and rate limiters
+    are shared by every worker thread that calls the model.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable[T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
 
 class LLMService:
     """
     Handles all communication with the LLM model (e.g., OpenAI GPT) for
     parsing unstructured OCR text into structured receipt data.
+
+    Calls go through an async client with a bounded number of in-flight requests,
+    token-bucket limits on requests and tokens per minute, per-call timeouts and
+    jittered exponential backoff on 429 and 5xx responses.
     """
 
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, model_id: Optional[str] = None):
+    # Bump whenever `_build_prompt` changes so cached results are not reused.
+    PROMPT_VERSION = "1"
+
+    def __init__(
+            self,
+            api_key: Optional[str] = None,
+            base_url: Optional[str] = None,
+            model_id: Optional[str] = None,
+            cache: Optional["LLMCache"] = None,
+    ):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.base_url = base_url or os.getenv("OPENAI_URL")
         self.model_id = model_id or os.getenv("MODEL_ID")
+        self.cache = cache
 
         if not self.api_key:
             logger.critical("OPENAI_API_KEY not provided or found in environment.")
             raise RuntimeError("Missing OPENAI_API_KEY.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # Retries are handled here (with rate-limit awareness), not by the SDK.
+        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=LLM_TIMEOUT, max_retries=0)
+
+        self._runner = _LoopThread()
+        self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._request_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self._token_bucket = TokenBucket(LLM_TOKENS_PER_MINUTE)
+
+    def close(self) -> None:
+        """
+        Closes the HTTP client's connections and stops the client's event loop.
+        """
+        self._runner.run(self.client.close())
+        self._runner.stop()
 
     def parse_receipt_text(self, raw_text: str) -> dict[str, Any] | None:
         """
         Sends raw OCR text to the LLM and expects structured JSON receipt data.
+        Blocks the calling worker thread while the call runs on the client's event loop.
 
         Args:
             raw_text (str): OCR text from receipt
@@ -38,25 +112,88 @@ class LLMService:
         Returns:
             dict[str, Any] | None: Structured receipt fields or None on failure
         """
+        return self._runner.run(self._parse(raw_text))
+
+    async def _parse(self, raw_text: str) -> dict[str, Any] | None:
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(raw_text, self.model_id, self.PROMPT_VERSION)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info("LLM cache hit; skipping model call.")
+                return cached
+
         prompt = self._build_prompt(raw_text)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_id,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-
-            content = response.choices[0].message.content
-            return json.loads(content)
-
+            content = await self._complete(prompt)
+            structured_data = json.loads(content)
         except Exception as e:
+            FAILURES.labels("llm").inc()
             logger.error(f"LLM error during JSON parsing: {e}")
             return None
 
+        if cache_key is not None and structured_data:
+            await asyncio.to_thread(self.cache.set, cache_key, self.model_id, self.PROMPT_VERSION, structured_data)
+        return structured_data
+
+    async def _complete(self, prompt: str) -> str:
+        """
+        Runs one chat completion within the concurrency and rate limits, retrying
+        rate-limit, server, timeout and connection errors with jittered backoff.
+        """
+        # Rough token estimate (~4 characters per token) corrected once usage is known.
+        estimated_tokens = len(prompt) // 4 + LLM_MAX_OUTPUT_TOKENS
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            # The concurrency slot is only held for the call itself, not during the backoff sleep
+            async with self._semaphore:
+                await self._request_bucket.acquire(1)
+                await self._token_bucket.acquire(estimated_tokens)
+                try:
+                    with LLM_IN_PROGRESS.track_inprogress(), time_stage("llm"):
+                        response = await self.client.chat.completions.create(
+                            model=self.model_id,
+                            response_format={"type": "json_object"},
+                            messages=[
+                                {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
+                                {"role": "user", "content": prompt}
+                            ]
+                        )
+                except Exception as e:
+                    if attempt >= LLM_MAX_RETRIES or not self._is_retryable(e):
+                        raise
+                    FAILURES.labels("llm_retry").inc()
+                    delay = self._backoff_delay(attempt, e)
+                    logger.warning(f"LLM call failed ({e.__class__.__name__}); retrying in {delay:.1f}s")
+                else:
+                    if response.usage is not None:
+                        self._token_bucket.adjust(response.usage.total_tokens - estimated_tokens)
+                        LLM_TOKENS.labels("prompt").observe(response.usage.prompt_tokens)
+                        LLM_TOKENS.labels("completion").observe(response.usage.completion_tokens)
+                    return response.choices[0].message.content
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    @staticmethod
+    def _backoff_delay(attempt: int, error: Exception) -> float:
+        """
+        Full-jitter exponential backoff, never shorter than the server's Retry-After.
+        """
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        if isinstance(error, openai.APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+            try:
+                delay = max(delay, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+        return delay
+
     @staticmethod
     def _build_prompt(text: str) -> str:
         """
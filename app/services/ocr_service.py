@@ -1,36 +1,66 @@
+import asyncio
+import multiprocessing
 import os
-from typing import Any, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Tuple
 
-import pytesseract
-from PyPDF2 import PdfReader
-from PyPDF2.errors import PdfReadError
 from dotenv import load_dotenv
-from pdf2image import convert_from_path, exceptions
 
-from app.services.llm_service import LLMService
+from app.core.metrics import FAILURES, STAGE_SECONDS
+from app.core.services import services
+from app.services.llm_cache import llm_cache
+from app.services.storage import local_path
 from utils.logging import log
 
+if TYPE_CHECKING:
+    from app.services.llm_service import LLMService
+
+# PyPDF2, pdf2image (Pillow) and the OpenAI SDK are imported where they are first
+# used, so that the API, CLIs and tools that never touch a PDF or the LLM start fast.
+
 logger = log(__name__)
 
-llm = LLMService()
 # Load environment variables from a .env file (for OPENAI_API_KEY)
 load_dotenv()
 
 # Fetch the API key from environment variables
 poppler = os.getenv("POPPLER_PATH")
 
+# Number of pages OCR'd in parallel (process pool size)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+# Threads validating uploaded PDFs for the async API routes
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "4"))
+
+# Render settings; peak memory per OCR task is roughly OCR_RENDER_WINDOW pages at OCR_DPI
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+OCR_RENDER_WINDOW = max(1, int(os.getenv("OCR_RENDER_WINDOW", "1")))
+
+# OCR engine: "auto" (tesserocr if installed, else pytesseract), "tesserocr" or "pytesseract"
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Pages whose embedded text layer has at least this many alphanumeric characters skip OCR
+TEXT_LAYER_ENABLED = os.getenv("TEXT_LAYER_ENABLED", "true").lower() in ("1", "true", "yes")
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", "20"))
+
 
 # --- 1. PDF Validation ---
 def validate_pdf(file_path: str) -> Tuple[bool, str]:
     """
     Validates whether the file at the given path is a readable and intact PDF.
     Args:
-        file_path (str): Absolute path to the PDF file.
+        file_path (str): Path to the stored PDF file (may be compressed).
     Returns:
         Tuple[bool, str]: A tuple with validation status and message.
     """
+    from PyPDF2 import PdfReader
+    from PyPDF2.errors import PdfReadError
+
     try:
-        with open(file_path, 'rb') as f:
+        with local_path(file_path) as path, open(path, 'rb') as f:
             PdfReader(f)
         logger.info(f"File {file_path} is a valid PDF.")
         return True, "File is a valid PDF."
@@ -42,44 +72,220 @@ def validate_pdf(file_path: str) -> Tuple[bool, str]:
         return False, f"An unexpected error occurred: {e}"
 
 
-# --- 2. Main OCR + AI Extraction Pipeline ---
-def extract_data_from_receipt(file_path: str) -> dict[str, Any] | None:
+async def validate_pdf_async(file_path: str) -> Tuple[bool, str]:
     """
-    Orchestrates the entire process of extracting structured data from a PDF receipt.
-    1. Convert PDF to images.
-    2. Run OCR on images to get raw text.
-    3. Sends raw text to an AI model for structured data extraction.
+    Runs `validate_pdf` on the validation thread pool, so parsing a large PDF
+    does not block the event loop of the async API routes.
+    """
+    return await asyncio.get_running_loop().run_in_executor(services.get("validation_pool"), validate_pdf, file_path)
 
-    Returns:
-        A dictionary containing the extracted receipt data.
+
+# --- 2. Shared Services ---
+def _create_ocr_pool() -> ProcessPoolExecutor:
     """
-    logger.info(f"Starting extraction for: {file_path}")
+    The process pool shared by all OCR jobs.
+    Workers are spawned (not forked) because the API process is multi-threaded,
+    and each one loads its OCR engine once and keeps it for every page it handles.
+    """
+    from app.services.ocr_worker import init_worker
 
-    POPPLER_PATH = poppler
+    pool = ProcessPoolExecutor(
+        max_workers=OCR_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(OCR_ENGINE, OCR_LANG),
+    )
+    logger.info(f"Started OCR process pool with {OCR_WORKERS} worker(s).")
+    return pool
 
-    # Step 1: Convert PDF to a list of PIL Images
-    try:
-        images = convert_from_path(pdf_path=file_path, poppler_path=POPPLER_PATH)
 
-    except exceptions.PDFInfoNotInstalledError:
-        logger.critical(f"Poppler not found at path: {POPPLER_PATH}")
-        logger.critical("Please verify the poppler_path variable in ocr_service.py is correct.")
-        return None
+def _create_validation_pool() -> ThreadPoolExecutor:
+    """
+    The thread pool that validates uploads for the async routes. Kept separate
+    from the event loop's default executor so a burst of uploads cannot starve
+    other blocking work.
+    """
+    return ThreadPoolExecutor(max_workers=VALIDATION_WORKERS, thread_name_prefix="validate")
+
+
+def _create_llm() -> "LLMService":
+    from app.services.llm_service import LLMService
+
+    return LLMService(cache=llm_cache)
+
+
+def _shutdown_pool(pool) -> None:
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+services.register("ocr_pool", _create_ocr_pool, close=_shutdown_pool)
+services.register("validation_pool", _create_validation_pool, close=_shutdown_pool)
+services.register("llm", _create_llm, close=lambda llm: llm.close())
+
+
+def get_llm() -> "LLMService":
+    """
+    Returns the shared LLM client, creating it (and importing the OpenAI SDK) on first use.
+    Raises RuntimeError if OPENAI_API_KEY is not set.
+    """
+    return services.get("llm")
+
+
+# --- 3. Per-Page Text Extraction ---
+def _read_text_layer(file_path: str) -> list[str] | None:
+    """
+    Reads the embedded text layer of every page with PyPDF2.
+    Returns None if the file cannot be parsed, in which case every page is OCR'd.
+    """
+    from PyPDF2 import PdfReader
+
+    try:
+        reader = PdfReader(file_path)
+        texts = []
+        for page in reader.pages:
+            try:
+                texts.append(page.extract_text() or "")
+            except Exception:
+                texts.append("")
+        return texts
     except Exception as e:
-        logger.error(f"An error occurred during PDF to Image conversion: {e}")
+        logger.warning(f"Could not read text layer of {file_path}: {e}")
         return None
 
-    # Step 2: Run OCR on each image and concatenate the text
-    raw_text = ""
-    for img in images:
+
+def _has_usable_text(text: str) -> bool:
+    return sum(ch.isalnum() for ch in text) >= TEXT_LAYER_MIN_CHARS
+
+
+def _ocr_windows(page_numbers: list[int]) -> list[tuple[int, int]]:
+    """
+    Groups page numbers into contiguous (first, last) windows of at most OCR_RENDER_WINDOW pages.
+    """
+    windows: list[tuple[int, int]] = []
+    for n in page_numbers:
+        if windows and windows[-1][1] == n - 1 and n - windows[-1][0] < OCR_RENDER_WINDOW:
+            windows[-1] = (windows[-1][0], n)
+        else:
+            windows.append((n, n))
+    return windows
+
+
+def _observe_ocr_page(page: dict[str, Any]) -> None:
+    # Timings are measured in the OCR worker processes and recorded here, in the app process.
+    if page["render_ms"] is not None:
+        STAGE_SECONDS.labels("pdf_render").observe(page["render_ms"] / 1000)
+    if page["error"]:
+        FAILURES.labels("ocr_page").inc()
+    elif page["duration_ms"] is not None:
+        STAGE_SECONDS.labels("ocr").observe((page["duration_ms"] - (page["render_ms"] or 0.0)) / 1000)
+
+
+def extract_pages(file_path: str, on_window: Callable[[], None] | None = None) -> list[dict[str, Any]] | None:
+    """
+    Extracts the text of every page of a PDF.
+
+    Pages with a usable embedded text layer (digital PDFs) are read directly.
+    The remaining image-only pages are rendered and OCR'd in windows of
+    OCR_RENDER_WINDOW pages through the OCR process pool. `on_window` is called
+    after each window; if it raises, the windows not yet started are cancelled.
+
+    Returns:
+        list[dict[str, Any]] | None: One record per page (`page`, `text`, `error`, `source`,
+        `engine`, `duration_ms`), in page order, or None if the PDF could not be opened by Poppler.
+        `source` is "text_layer" or "ocr"; `engine` names the OCR engine for OCR'd pages.
+    """
+    from pdf2image import exceptions, pdfinfo_from_path
+
+    from app.services.ocr_worker import ocr_page_range
+
+    POPPLER_PATH = poppler
+
+    started = time.perf_counter()
+    text_layer = _read_text_layer(file_path) if TEXT_LAYER_ENABLED else None
+    text_layer_ms = (time.perf_counter() - started) * 1000
+    if TEXT_LAYER_ENABLED:
+        STAGE_SECONDS.labels("text_layer").observe(text_layer_ms / 1000)
+    if text_layer is not None:
+        page_count = len(text_layer)
+    else:
         try:
-            raw_text += pytesseract.image_to_string(img) + "\n\n"
-        except pytesseract.TesseractNotFoundError:
-            raise Exception("Tesseract is not installed or not in your PATH.")
+            page_count = pdfinfo_from_path(file_path, poppler_path=POPPLER_PATH)["Pages"]
+        except exceptions.PDFInfoNotInstalledError:
+            logger.critical(f"Poppler not found at path: {POPPLER_PATH}")
+            logger.critical("Please verify the POPPLER_PATH environment variable is correct.")
+            return None
         except Exception as e:
-            logger.error(f"Error during OCR on an image page: {e}")
-            continue
+            logger.error(f"An error occurred while reading PDF info: {e}")
+            return None
+
+    pages: dict[int, dict[str, Any]] = {}
+    ocr_page_numbers = []
+    for n in range(1, page_count + 1):
+        text = text_layer[n - 1] if text_layer is not None else ""
+        if _has_usable_text(text):
+            pages[n] = {
+                "page": n,
+                "text": text,
+                "error": None,
+                "source": "text_layer",
+                "engine": None,
+                "duration_ms": round(text_layer_ms / page_count, 1),
+            }
+        else:
+            ocr_page_numbers.append(n)
+
+    if ocr_page_numbers:
+        # Pages are rendered in small windows so that only a few pages are ever in flight.
+        windows = _ocr_windows(ocr_page_numbers)
+        render_args = (POPPLER_PATH, OCR_DPI, OCR_GRAYSCALE, OCR_ENGINE, OCR_LANG)
+
+        results = []
+        if OCR_WORKERS <= 1 or len(windows) <= 1:
+            for first, last in windows:
+                results.append(ocr_page_range(file_path, first, last, *render_args))
+                if on_window:
+                    on_window()
+        else:
+            pool = services.get("ocr_pool")
+            futures = [pool.submit(ocr_page_range, file_path, first, last, *render_args) for first, last in windows]
+            try:
+                for future in futures:
+                    results.append(future.result())
+                    if on_window:
+                        on_window()
+            finally:
+                for future in futures:
+                    future.cancel()  # No-op for finished windows
+
+        for window in results:
+            for page in window:
+                pages[page["page"]] = {**page, "source": "ocr"}
+                _observe_ocr_page(page)
+
+    logger.info(
+        f"Extracted {page_count} page(s) from {file_path}: "
+        f"{page_count - len(ocr_page_numbers)} from text layer, {len(ocr_page_numbers)} via OCR."
+    )
+    return [pages[n] for n in range(1, page_count + 1)]
 
+
+# --- 4. Main OCR + AI Extraction Pipeline ---
+def join_pages(pages: list[dict[str, Any]]) -> str:
+    """
+    Joins the text of successfully extracted pages in page order.
+    """
+    return "\n\n".join(page["text"] for page in pages if not page["error"])
+
+
+def parse_pages(pages: list[dict[str, Any]]) -> dict[str, Any] | None:
+    """
+    Joins per-page OCR text in page order and sends it to the AI model.
+    """
+    for page in pages:
+        if page["error"]:
+            logger.warning(f"OCR failed on page {page['page']}: {page['error']}")
+
+    raw_text = join_pages(pages)
     if not raw_text.strip():
         logger.info("OCR process yielded no text.")
         return None
@@ -88,8 +294,8 @@ def extract_data_from_receipt(file_path: str) -> dict[str, Any] | None:
     logger.debug(raw_text[:1000])
     logger.debug("--------------------")
 
-    # Step 3: Use AI (GPT) to parse the raw text into structured JSON
-    structured_data = llm.parse_receipt_text(raw_text=raw_text)
+    # Use AI (GPT) to parse the raw text into structured JSON
+    structured_data = get_llm().parse_receipt_text(raw_text=raw_text)
 
     if not structured_data:
         logger.info("AI model failed to parse the text.")
@@ -97,3 +303,20 @@ def extract_data_from_receipt(file_path: str) -> dict[str, Any] | None:
 
     logger.debug(structured_data)
     return structured_data
+
+
+def extract_data_from_receipt(file_path: str) -> dict[str, Any] | None:
+    """
+    Orchestrates the entire process of extracting structured data from a PDF receipt.
+    1. Read the embedded text layer, and OCR image-only pages in parallel.
+    2. Sends the page text, in order, to an AI model for structured data extraction.
+
+    Returns:
+        A dictionary containing the extracted receipt data.
+    """
+    logger.info(f"Starting extraction for: {file_path}")
+
+    pages = extract_pages(file_path)
+    if pages is None:
+        return None
+    return parse_pages(pages)
@@ -0,0 +1,194 @@
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from pdf2image import convert_from_path
+
+from utils.logging import log
+
+logger = log(__name__)
+
+# ----------------------------------------
+# OCR Worker
+# ----------------------------------------
+
+# This module runs inside the OCR process pool. It is kept free of app-level
+# imports (DB, LLM client) so that spawning a worker stays cheap.
+
+
+class TesseractUnavailableError(RuntimeError):
+    """Raised when Tesseract itself is missing; aborts the whole document rather than one page."""
+
+
+class OcrEngine(ABC):
+    """
+    Turns a page image on disk into text.
+    """
+    name = "base"
+
+    @abstractmethod
+    def image_to_string(self, image_path: str) -> str:
+        ...
+
+
+class PytesseractEngine(OcrEngine):
+    """
+    Runs the `tesseract` CLI once per page. Always available, but reloads the
+    language model for every page.
+    """
+    name = "pytesseract"
+
+    def __init__(self, lang: str = "eng"):
+        import pytesseract
+
+        self._pytesseract = pytesseract
+        self.lang = lang
+
+    def image_to_string(self, image_path: str) -> str:
+        try:
+            return self._pytesseract.image_to_string(image_path, lang=self.lang)
+        except self._pytesseract.TesseractNotFoundError:
+            # Re-raised as a simple exception so it pickles back to the parent process.
+            raise TesseractUnavailableError("Tesseract is not installed or not in your PATH.")
+
+
+class TesserocrEngine(OcrEngine):
+    """
+    Keeps one libtesseract instance loaded for the life of the worker process,
+    so pages skip process start-up and model loading. Requires `tesserocr`.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang: str = "eng"):
+        import tesserocr
+
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def image_to_string(self, image_path: str) -> str:
+        self.api.SetImageFile(image_path)
+        return self.api.GetUTF8Text()
+
+
+# Engines are not thread-safe, so each thread gets its own. Pool workers are
+# single-threaded and therefore keep exactly one engine for their lifetime.
+_local = threading.local()
+
+
+def create_engine(name: str = "auto", lang: str = "eng") -> OcrEngine:
+    """
+    Builds the requested OCR engine. "auto" prefers tesserocr and falls back to pytesseract,
+    as do "tesserocr" when it is not installed and unknown names, with a warning.
+    """
+    if name in ("auto", TesserocrEngine.name):
+        try:
+            return TesserocrEngine(lang=lang)
+        except Exception as e:
+            logger.warning(f"tesserocr unavailable ({e}); OCR_ENGINE={name} falls back to pytesseract.")
+    elif name != PytesseractEngine.name:
+        logger.warning(f"Unknown OCR_ENGINE {name!r}; using pytesseract.")
+    return PytesseractEngine(lang=lang)
+
+
+def init_worker(engine_name: str = "auto", lang: str = "eng") -> None:
+    """
+    Process pool initializer: loads the OCR engine once per worker process.
+    """
+    _local.engine = create_engine(engine_name, lang)
+
+
+def get_engine(engine_name: str = "auto", lang: str = "eng") -> OcrEngine:
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        engine = _local.engine = create_engine(engine_name, lang)
+    return engine
+
+
+def ocr_page_range(
+        file_path: str,
+        first_page: int,
+        last_page: int,
+        poppler_path: str | None = None,
+        dpi: int = 200,
+        grayscale: bool = True,
+        engine_name: str = "auto",
+        lang: str = "eng",
+) -> list[dict[str, Any]]:
+    """
+    Renders a window of PDF pages to a temporary directory and runs OCR on each one.
+
+    Pages are rendered straight to disk and handed to the OCR engine by path, so no
+    full-resolution image is ever held in this process. Peak memory is bounded by
+    the window size rather than the document length.
+
+    Args:
+        file_path (str): Path to the PDF file.
+        first_page (int): 1-based first page of the window.
+        last_page (int): 1-based last page of the window (inclusive).
+        poppler_path (str | None): Optional Poppler 'bin' directory.
+        dpi (int): Render resolution.
+        grayscale (bool): Render in grayscale (a third of the size of RGB).
+        engine_name (str): OCR engine used if this process has none loaded yet.
+        lang (str): Tesseract language.
+
+    Returns:
+        list[dict[str, Any]]: One record per page with `page`, `text`, `error`, `engine`,
+        `render_ms` (the page's share of the window's render time) and `duration_ms`
+        (render share plus OCR time) keys.
+    """
+    engine = get_engine(engine_name, lang)
+    page_numbers = range(first_page, last_page + 1)
+    with tempfile.TemporaryDirectory(prefix="ocr-") as output_folder:
+        started = time.perf_counter()
+        try:
+            image_paths = convert_from_path(
+                pdf_path=file_path,
+                dpi=dpi,
+                grayscale=grayscale,
+                first_page=first_page,
+                last_page=last_page,
+                poppler_path=poppler_path,
+                output_folder=output_folder,
+                paths_only=True,
+            )
+        except Exception as e:
+            return [_page(n, error=f"Render failed: {e}") for n in page_numbers]
+
+        # pdftoppm names its output files in page order.
+        image_paths = sorted(image_paths)
+        if len(image_paths) != len(page_numbers):
+            return [_page(n, error="Render produced an unexpected number of pages.") for n in page_numbers]
+        render_ms = (time.perf_counter() - started) * 1000 / len(page_numbers)
+
+        return [_ocr_image(engine, path, n, render_ms) for path, n in zip(image_paths, page_numbers)]
+
+
+def _page(
+        page_number: int,
+        text: str = "",
+        error: str | None = None,
+        engine: str | None = None,
+        duration_ms: float | None = None,
+        render_ms: float | None = None,
+) -> dict[str, Any]:
+    return {
+        "page": page_number,
+        "text": text,
+        "error": error,
+        "engine": engine,
+        "duration_ms": duration_ms,
+        "render_ms": render_ms,
+    }
+
+
+def _ocr_image(engine: OcrEngine, image_path: str, page_number: int, render_ms: float = 0.0) -> dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        text = engine.image_to_string(image_path)
+    except TesseractUnavailableError:
+        raise
+    except Exception as e:
+        return _page(page_number, error=str(e), engine=engine.name, render_ms=render_ms)
+    duration_ms = render_ms + (time.perf_counter() - started) * 1000
+    return _page(page_number, text=text, engine=engine.name, duration_ms=round(duration_ms, 1), render_ms=render_ms)
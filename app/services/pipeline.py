@@ -0,0 +1,313 @@
+import os
+import socket
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.crud import (
+    claim_for_reextract,
+    claim_receipt_file,
+    create_receipt_and_items,
+    enqueue_receipt_file,
+    fail_exhausted_leases,
+    fail_receipt_file,
+    get_reextractable_file_ids,
+    get_receipt_file,
+    get_receipt_pages,
+    get_stale_receipt_file_ids,
+    release_queued_leases,
+    renew_lease,
+    renew_queued_leases,
+    replace_receipt,
+    requeue_stale_receipt_file,
+    save_receipt_pages,
+)
+from app.services import ocr_service
+from app.services.job_queue import Job, JobQueue, QueueFullError
+from app.services.storage import local_path
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# Also index raw OCR text for full-text search (larger index, matches any printed text)
+SEARCH_INDEX_OCR_TEXT = os.getenv("SEARCH_INDEX_OCR_TEXT", "false").lower() in ("1", "true", "yes")
+
+# Processing leases: a worker must finish (or renew) within the lease, otherwise the
+# file is considered abandoned and another worker may claim it.
+PROCESS_LEASE_SECONDS = int(os.getenv("PROCESS_LEASE_SECONDS", "600"))
+PROCESS_MAX_ATTEMPTS = int(os.getenv("PROCESS_MAX_ATTEMPTS", "3"))
+LEASE_SWEEP_INTERVAL = int(os.getenv("LEASE_SWEEP_INTERVAL", "60"))
+
+# Re-extraction only calls the LLM, so it gets its own, wider pool
+REEXTRACT_WORKERS = int(os.getenv("REEXTRACT_WORKERS", "8"))
+REEXTRACT_QUEUE_SIZE = int(os.getenv("REEXTRACT_QUEUE_SIZE", "100000"))
+
+
+class ProcessingError(Exception):
+    """Raised when a receipt file cannot be turned into a receipt."""
+
+
+class AlreadyQueuedError(ProcessingError):
+    """Raised when a file is already queued, being processed or done."""
+
+
+@dataclass
+class ProcessResult:
+    receipt_id: int
+    failed_pages: list[dict[str, Any]] = field(default_factory=list)
+    text_layer_pages: int = 0
+    ocr_pages: int = 0
+
+
+def _lease_token() -> str:
+    # Unique per attempt, so a worker whose lease expired cannot finish someone else's claim.
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+
+
+# Owner of the queue leases on files this process holds in its in-memory queue. The lease
+# sweep renews them, so another process only takes the files over once this one is gone.
+QUEUE_OWNER = _lease_token()
+
+
+def process_receipt_file(file_id: int) -> ProcessResult:
+    """
+    Runs the OCR + LLM pipeline for a validated receipt file and stores the result.
+    Executed by the background job workers, so it manages its own DB session.
+
+    The file is claimed with a lease first, so however many workers or replicas
+    receive the same file ID, only one of them runs the pipeline.
+
+    Returns:
+        ProcessResult: ID of the new receipt and any pages that failed OCR.
+    """
+    lease_owner = _lease_token()
+    db = SessionLocal()
+    try:
+        db_file = get_receipt_file(db, file_id=file_id)
+        if not db_file:
+            raise ProcessingError("File not found")
+        if db_file.is_valid is not True:
+            raise ProcessingError("File has not been validated or is invalid.")
+        if not claim_receipt_file(
+                db, file_id=file_id, lease_owner=lease_owner,
+                lease_seconds=PROCESS_LEASE_SECONDS, max_attempts=PROCESS_MAX_ATTEMPTS,
+        ):
+            raise ProcessingError("File has already been processed or is being processed by another worker.")
+
+        try:
+            return _run_pipeline(db, file_id, db_file.file_path, lease_owner)
+        except Exception as e:
+            db.rollback()
+            fail_receipt_file(db, file_id=file_id, error=str(e), lease_owner=lease_owner)
+            raise
+    finally:
+        db.close()
+
+
+def _run_pipeline(db: Session, file_id: int, file_path: str, lease_owner: str) -> ProcessResult:
+    # OCR (per page) + LLM extraction. Pages are stored as soon as they are extracted,
+    # so a retry after an LLM failure goes straight to extraction, unless some pages
+    # failed OCR last time: then the file is extracted again and the stored pages replaced.
+    def keep_lease():
+        if not renew_lease(db, file_id=file_id, lease_owner=lease_owner, lease_seconds=PROCESS_LEASE_SECONDS):
+            raise ProcessingError("Processing lease was lost to another worker.")
+
+    pages = get_receipt_pages(db, file_id=file_id)
+    if not pages or any(page["error"] for page in pages):
+        # Renewed after every OCR window, so long documents keep the lease
+        with local_path(file_path) as path:
+            pages = ocr_service.extract_pages(path, on_window=keep_lease)
+        if pages is None:
+            raise ProcessingError("Failed to render receipt PDF.")
+        try:
+            save_receipt_pages(db, file_id=file_id, pages=pages, lease_owner=lease_owner)
+        except ValueError as e:
+            raise ProcessingError(str(e))
+
+    keep_lease()
+
+    extracted_data = ocr_service.parse_pages(pages)
+    if not extracted_data:
+        raise ProcessingError("Failed to extract data from receipt.")
+
+    # Create records and mark the file done in one transaction, fenced on our lease
+    try:
+        receipt_id = create_receipt_and_items(
+            db,
+            extracted_data=extracted_data,
+            file_id=file_id,
+            ocr_text=ocr_service.join_pages(pages) if SEARCH_INDEX_OCR_TEXT else None,
+            lease_owner=lease_owner,
+        )
+    except ValueError as e:
+        raise ProcessingError(str(e))
+
+    logger.info(f"Processed receipt ID: {receipt_id}")
+    return _result(receipt_id, pages)
+
+
+def _result(receipt_id: int, pages: list[dict[str, Any]]) -> ProcessResult:
+    return ProcessResult(
+        receipt_id=receipt_id,
+        failed_pages=[{"page": p["page"], "error": p["error"]} for p in pages if p["error"]],
+        text_layer_pages=sum(p["source"] == "text_layer" for p in pages),
+        ocr_pages=sum(p["source"] == "ocr" for p in pages),
+    )
+
+
+def reextract_receipt_file(file_id: int) -> ProcessResult:
+    """
+    Re-runs AI extraction for a processed file from its stored page text and
+    replaces its receipt. No rendering or OCR is done, so the cost is LLM time only.
+    Executed by the re-extraction workers, so it manages its own DB session.
+
+    Returns:
+        ProcessResult: ID of the new receipt; page counts describe the stored pages.
+    """
+    lease_owner = _lease_token()
+    db = SessionLocal()
+    try:
+        if not claim_for_reextract(db, file_id=file_id, lease_owner=lease_owner, lease_seconds=PROCESS_LEASE_SECONDS):
+            raise ProcessingError("File is not processed or is being processed by another worker.")
+
+        try:
+            pages = get_receipt_pages(db, file_id=file_id)
+            if not pages:
+                raise ProcessingError("No stored page text for this file.")
+
+            extracted_data = ocr_service.parse_pages(pages)
+            if not extracted_data:
+                raise ProcessingError("Failed to extract data from receipt.")
+
+            try:
+                receipt_id = replace_receipt(
+                    db,
+                    extracted_data=extracted_data,
+                    file_id=file_id,
+                    lease_owner=lease_owner,
+                    ocr_text=ocr_service.join_pages(pages) if SEARCH_INDEX_OCR_TEXT else None,
+                )
+            except ValueError as e:
+                raise ProcessingError(str(e))
+        except Exception as e:
+            db.rollback()
+            fail_receipt_file(db, file_id=file_id, error=str(e), lease_owner=lease_owner)
+            raise
+
+        logger.info(f"Re-extracted file_id={file_id} into receipt ID: {receipt_id}")
+        return _result(receipt_id, pages)
+    finally:
+        db.close()
+
+
+def submit_processing(db: Session, file_id: int) -> Job:
+    """
+    Marks a file as queued and submits it to the job queue.
+
+    Raises:
+        AlreadyQueuedError: If the file is already queued, running or done.
+        QueueFullError: If the queue is full; the file is marked failed so it can be resubmitted.
+    """
+    if not enqueue_receipt_file(db, file_id=file_id, queue_owner=QUEUE_OWNER, lease_seconds=PROCESS_LEASE_SECONDS):
+        raise AlreadyQueuedError("File is already queued or being processed.")
+    try:
+        return job_queue.submit(file_id)
+    except QueueFullError as e:
+        fail_receipt_file(db, file_id=file_id, error=str(e))
+        raise
+
+
+def submit_reextract(db: Session, file_ids: list[int] | None = None) -> dict[str, Any]:
+    """
+    Queues re-extraction for processed files with stored pages: the given
+    `file_ids`, or every such file. Requested files that are not processed or
+    have no stored pages are counted as skipped. If the queue fills up, the
+    files queued so far keep running and the rest are reported in `message`.
+    """
+    eligible = get_reextractable_file_ids(db, file_ids=file_ids)
+    result: dict[str, Any] = {
+        "queued": 0,
+        "skipped": len(set(file_ids)) - len(eligible) if file_ids is not None else 0,
+        "job_ids": [],
+        "message": None,
+    }
+    for i, file_id in enumerate(eligible):
+        try:
+            job = reextract_queue.submit(file_id)
+        except QueueFullError as e:
+            result["message"] = f"{e} {len(eligible) - i} file(s) were not queued."
+            break
+        result["job_ids"].append(job.id)
+        result["queued"] += 1
+    return result
+
+
+def recover_stale_jobs() -> int:
+    """
+    Runs on startup and then periodically on the lease sweep: renews the queue leases
+    on files this process has queued, fails files whose processing lease expired on
+    their last attempt, and takes over and resubmits abandoned files, i.e. those whose
+    processing or queue lease expired because their process died. Files queued or
+    running in other live processes are left alone.
+
+    Returns:
+        int: Number of files resubmitted.
+    """
+    db = SessionLocal()
+    submitted = 0
+    try:
+        renew_queued_leases(db, queue_owner=QUEUE_OWNER, lease_seconds=PROCESS_LEASE_SECONDS)
+        exhausted = fail_exhausted_leases(db, max_attempts=PROCESS_MAX_ATTEMPTS)
+        if exhausted:
+            logger.warning(f"Failed {exhausted} file(s) whose processing lease expired and will not be retried.")
+
+        for file_id in get_stale_receipt_file_ids(db):
+            if not requeue_stale_receipt_file(
+                    db, file_id=file_id, queue_owner=QUEUE_OWNER,
+                    lease_seconds=PROCESS_LEASE_SECONDS, max_attempts=PROCESS_MAX_ATTEMPTS,
+            ):
+                continue  # Taken over by another process
+            try:
+                job_queue.submit(file_id)
+            except QueueFullError:
+                release_queued_leases(db, queue_owner=QUEUE_OWNER, file_id=file_id)
+                logger.warning("Processing queue is full; remaining stale files will be retried on the next sweep.")
+                break
+            submitted += 1
+    finally:
+        db.close()
+
+    if submitted:
+        logger.info(f"Resubmitted {submitted} stale file(s) for processing.")
+    return submitted
+
+
+def release_queued_jobs() -> int:
+    """
+    Releases the queue leases of files this process still had queued, e.g. after its
+    queue was stopped, so other processes take them over on their next sweep instead
+    of after the lease expires.
+
+    Returns:
+        int: Number of files released.
+    """
+    db = SessionLocal()
+    try:
+        return release_queued_leases(db, queue_owner=QUEUE_OWNER)
+    finally:
+        db.close()
+
+
+# Shared queues used by the API; started and stopped with the app.
+job_queue = JobQueue(handler=process_receipt_file, sweep=recover_stale_jobs, sweep_interval=LEASE_SWEEP_INTERVAL)
+reextract_queue = JobQueue(
+    handler=reextract_receipt_file,
+    workers=REEXTRACT_WORKERS,
+    max_size=REEXTRACT_QUEUE_SIZE,
+    name="reextract",
+)
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket used to stay under provider rate limits
+    (e.g. requests per minute or tokens per minute).
+
+    The bucket holds at most `capacity` tokens and refills continuously at
+    `capacity / period` tokens per second. A `capacity` of 0 disables limiting.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period if capacity else 0.0
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        Waits until `amount` tokens are available and takes them.
+        Requests larger than the bucket are capped so they can eventually proceed.
+        """
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        """
+        Corrects an earlier estimate once the real cost is known.
+        Positive `delta` takes extra tokens (the balance may go negative), negative refunds them.
+        """
+        if not self.capacity:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - delta)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
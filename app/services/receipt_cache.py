@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.metrics import RECEIPT_CACHE_REQUESTS
+from app.crud import CHANGED_RECEIPTS_KEY
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# ----------------------------------------
+# Cache Configuration
+# ----------------------------------------
+
+RECEIPT_CACHE_ENABLED = os.getenv("RECEIPT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RECEIPT_CACHE_MAX_ENTRIES = int(os.getenv("RECEIPT_CACHE_MAX_ENTRIES", "10000"))
+# Bounds staleness when another process (worker or replica) changes a receipt
+RECEIPT_CACHE_TTL = float(os.getenv("RECEIPT_CACHE_TTL", "60"))
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Strong ETag: a hash of the exact response bytes.
+    """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Evaluates an If-None-Match header against `etag` (weak comparison, as RFC 9110 requires).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+class ReceiptResponseCache:
+    """
+    Bounded, in-process LRU cache of serialized `GET /receipts/{id}` responses.
+
+    Entries are evicted when a receipt is written through a session from an
+    attached session factory (see `attach`), and expire after `ttl` seconds to
+    bound staleness from writes made in other processes.
+    """
+
+    def __init__(self, max_entries: int = RECEIPT_CACHE_MAX_ENTRIES, ttl: float = RECEIPT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[int, CachedResponse] = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, receipt_id: int) -> CachedResponse | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(receipt_id)
+            if entry is None or entry.expires_at <= now:
+                self._entries.pop(receipt_id, None)
+                RECEIPT_CACHE_REQUESTS.labels("miss").inc()
+                return None
+            self._entries.move_to_end(receipt_id)
+        RECEIPT_CACHE_REQUESTS.labels("hit").inc()
+        return entry
+
+    def version(self) -> int:
+        """
+        Returns the invalidation counter. Read it before loading a receipt and pass it
+        to `set`, so a response built from data that was changed meanwhile is not stored.
+        """
+        with self._lock:
+            return self._version
+
+    def set(self, receipt_id: int, body: bytes, version: int) -> CachedResponse:
+        entry = CachedResponse(body=body, etag=make_etag(body), expires_at=time.monotonic() + self.ttl)
+        with self._lock:
+            if version == self._version:
+                self._entries[receipt_id] = entry
+                self._entries.move_to_end(receipt_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, receipt_ids) -> None:
+        with self._lock:
+            self._version += 1
+            for receipt_id in receipt_ids:
+                self._entries.pop(receipt_id, None)
+
+    def attach(self, session_factory: sessionmaker | type[Session]) -> None:
+        """
+        Evicts receipts changed in a session once that session commits.
+        """
+
+        @event.listens_for(session_factory, "after_commit")
+        def _after_commit(session):
+            changed = session.info.pop(CHANGED_RECEIPTS_KEY, None)
+            if changed:
+                self.invalidate(changed)
+
+        @event.listens_for(session_factory, "after_rollback")
+        def _after_rollback(session):
+            session.info.pop(CHANGED_RECEIPTS_KEY, None)
+
+
+# Shared instance; None when disabled.
+receipt_cache = ReceiptResponseCache() if RECEIPT_CACHE_ENABLED else None
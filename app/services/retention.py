@@ -0,0 +1,146 @@
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.crud import confirm_purged, get_purgeable_receipt_files, get_receipt_file, mark_purged
+from app.services.storage import delete_stored, put_back, remove_partial_uploads, set_aside
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# ----------------------------------------
+# Retention Policy
+# ----------------------------------------
+
+# Days after which stored files are deleted (0 = keep forever). Age counts from the last
+# change to the file record, i.e. validation for invalid files and processing for processed ones.
+RETENTION_INVALID_DAYS = float(os.getenv("RETENTION_INVALID_DAYS", "30"))
+RETENTION_PROCESSED_DAYS = float(os.getenv("RETENTION_PROCESSED_DAYS", "0"))
+# Seconds between retention runs inside the API process (0 = only via `python -m app.cli.retention`)
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "0"))
+
+# Temporary files of uploads interrupted longer ago than this are removed as well
+PARTIAL_UPLOAD_MAX_AGE = 24 * 3600
+
+RETENTION_BATCH_SIZE = 500
+
+
+def _cutoff(days: float) -> datetime | None:
+    return datetime.now(timezone.utc) - timedelta(days=days) if days > 0 else None
+
+
+def run_retention(
+        invalid_days: float = RETENTION_INVALID_DAYS,
+        processed_days: float = RETENTION_PROCESSED_DAYS,
+        dry_run: bool = False,
+) -> Counter:
+    """
+    Deletes stored files of invalid and processed receipts older than the policy allows,
+    plus abandoned partial uploads. Safe to run from several processes at once.
+
+    Returns:
+        Counter: `purged` files, `missing` (already gone from disk), `restored` (uploaded
+        again while being purged, so kept), `bytes` freed and `partial` uploads removed.
+        With `dry_run`, what would be deleted.
+    """
+    totals: Counter = Counter()
+    invalid_before, processed_before = _cutoff(invalid_days), _cutoff(processed_days)
+    after_id = 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            batch = get_purgeable_receipt_files(
+                db, invalid_before=invalid_before, processed_before=processed_before,
+                after_id=after_id, limit=RETENTION_BATCH_SIZE,
+            )
+            for file_id, file_path in batch:
+                try:
+                    size = os.path.getsize(file_path)
+                except OSError:
+                    size = 0
+                if dry_run:
+                    totals["purged"] += 1
+                    totals["bytes"] += size
+                    continue
+                if not mark_purged(db, file_id=file_id):
+                    continue
+                # The same content may be uploaded again and the record restored while this
+                # runs; the file is only deleted once the record is confirmed still purged.
+                aside = set_aside(file_path)
+                if not confirm_purged(db, file_id=file_id, file_path=file_path):
+                    _keep_restored(db, file_id, file_path, aside)
+                    totals["restored"] += 1
+                elif aside is None:
+                    totals["missing"] += 1
+                else:
+                    delete_stored(aside)
+                    totals["purged"] += 1
+                    totals["bytes"] += size
+            if len(batch) < RETENTION_BATCH_SIZE:
+                break
+            after_id = batch[-1][0]
+    finally:
+        db.close()
+
+    if not dry_run:
+        totals["partial"] = remove_partial_uploads(PARTIAL_UPLOAD_MAX_AGE)
+    logger.info(f"Retention {'dry run' if dry_run else 'run'} finished: {dict(totals)}")
+    return totals
+
+
+def _keep_restored(db: Session, file_id: int, file_path: str, aside: Path | None) -> None:
+    """
+    Handles a file that was uploaded again while being purged: the copy set aside goes
+    back if the restored record still points at its path, and is deleted otherwise.
+    """
+    if aside is None:
+        return
+    db_file = get_receipt_file(db, file_id=file_id)
+    if db_file is not None and db_file.purged_at is None and db_file.file_path == file_path:
+        put_back(aside, file_path)
+        logger.info(f"Kept file_id={file_id}: it was uploaded again while being purged.")
+    else:
+        delete_stored(aside)
+
+
+class RetentionScheduler:
+    """
+    Runs `run_retention` every `interval` seconds on a background thread.
+    """
+
+    def __init__(self, interval: float = RETENTION_INTERVAL):
+        self.interval = interval
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+        logger.info(f"Retention runs scheduled every {self.interval:g} second(s).")
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                run_retention()
+            except Exception:
+                logger.exception("Retention run failed")
+
+
+retention_scheduler = RetentionScheduler()
@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Protocol
+
+import anyio
+import anyio.to_thread
+from dotenv import load_dotenv
+
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# ----------------------------------------
+# File Upload Configuration
+# ----------------------------------------
+
+UPLOADS_DIR = Path(os.getenv("UPLOADS_DIR", "uploads"))  # Created on the first upload
+
+# Files live under UPLOADS_DIR/<ab>/<cd>/<sha256><suffix>: two hex characters per level,
+# so each directory holds at most 256 entries until the leaves (65,536 of them at depth 2).
+STORAGE_SHARD_DEPTH = int(os.getenv("STORAGE_SHARD_DEPTH", "2"))
+# Gzip new files on disk. Scanned PDFs are mostly JPEG data and barely shrink; digital ones do.
+STORAGE_COMPRESS = os.getenv("STORAGE_COMPRESS", "false").lower() in ("1", "true", "yes")
+STORAGE_COMPRESS_LEVEL = int(os.getenv("STORAGE_COMPRESS_LEVEL", "6"))
+
+CHUNK_SIZE = 1024 * 1024
+GZIP_SUFFIX = ".gz"
+PARTIAL_SUFFIX = ".part"
+
+
+class AsyncReadable(Protocol):
+    async def read(self, size: int = -1) -> bytes: ...
+
+    async def seek(self, offset: int) -> None: ...
+
+
+@dataclass
+class StoredFile:
+    path: Path
+    sha256: str
+    size: int
+
+
+def shard_dir(sha256: str) -> Path:
+    """
+    Returns the fan-out directory for content with the given hash.
+    """
+    return UPLOADS_DIR.joinpath(*(sha256[2 * i:2 * i + 2] for i in range(STORAGE_SHARD_DEPTH)))
+
+
+def is_compressed(path: str | Path) -> bool:
+    return str(path).endswith(GZIP_SUFFIX)
+
+
+def save_upload(source: BinaryIO, suffix: str = ".pdf") -> StoredFile:
+    """
+    Streams an upload to disk while computing its SHA-256 (of the original bytes).
+
+    The data is written to a temporary file first and then moved to a
+    content-addressed name in its shard directory (`<sha256><suffix>`, plus `.gz`
+    when compressed), so identical uploads map to the same path. Content already
+    stored in either form is not written again.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = _partial_path()
+    try:
+        with tmp_path.open("wb") as raw:
+            buffer: BinaryIO = raw
+            if STORAGE_COMPRESS:
+                buffer = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=STORAGE_COMPRESS_LEVEL, mtime=0)
+            with buffer:
+                while chunk := source.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    buffer.write(chunk)
+                    size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        file_path = _place(tmp_path, sha256, suffix)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return StoredFile(path=file_path, sha256=sha256, size=size)
+
+
+async def save_upload_async(source: AsyncReadable, suffix: str = ".pdf") -> StoredFile:
+    """
+    Async counterpart of `save_upload` for the API routes. Reads the upload
+    (e.g. a Starlette `UploadFile`) and writes it chunk by chunk without
+    blocking the event loop, storing it under the same path `save_upload` would.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    compressor = None
+    if STORAGE_COMPRESS:
+        # wbits 16 + MAX_WBITS writes a gzip stream, readable by `open_stored` like GzipFile output
+        compressor = zlib.compressobj(STORAGE_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    tmp_path = await anyio.to_thread.run_sync(_partial_path)
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as buffer:
+            while chunk := await source.read(CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                await buffer.write(compressor.compress(chunk) if compressor else chunk)
+            if compressor:
+                await buffer.write(compressor.flush())
+
+        sha256 = digest.hexdigest()
+        file_path = await anyio.to_thread.run_sync(_place, tmp_path, sha256, suffix)
+    finally:
+        await anyio.Path(tmp_path).unlink(missing_ok=True)
+
+    return StoredFile(path=file_path, sha256=sha256, size=size)
+
+
+def _partial_path() -> Path:
+    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+    return UPLOADS_DIR / f".{uuid.uuid4()}{PARTIAL_SUFFIX}"
+
+
+def _place(tmp_path: Path, sha256: str, suffix: str) -> Path:
+    """
+    Moves a fully written temporary file to its content-addressed path, unless
+    the same content is already stored (compressed or not), and returns the path.
+    """
+    plain_path = shard_dir(sha256) / f"{sha256}{suffix}"
+    compressed_path = plain_path.with_name(plain_path.name + GZIP_SUFFIX)
+    existing = next((p for p in (plain_path, compressed_path) if p.exists()), None)
+    if existing is not None:
+        return existing
+    file_path = compressed_path if STORAGE_COMPRESS else plain_path
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def open_stored(path: str | Path) -> BinaryIO:
+    """
+    Opens a stored file for reading its original bytes, decompressing if needed.
+    """
+    return gzip.open(path, "rb") if is_compressed(path) else open(path, "rb")
+
+
+@contextmanager
+def local_path(path: str | Path) -> Iterator[str]:
+    """
+    Yields a path to the original bytes of a stored file, for tools that need a real
+    file (Poppler, PyPDF2). Compressed files are expanded into a temporary file that
+    is removed on exit; uncompressed files are used in place.
+    """
+    if not is_compressed(path):
+        yield str(path)
+        return
+
+    fd, tmp_name = tempfile.mkstemp(suffix=Path(str(path)[:-len(GZIP_SUFFIX)]).suffix)
+    try:
+        with os.fdopen(fd, "wb") as tmp, gzip.open(path, "rb") as src:
+            shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+        yield tmp_name
+    finally:
+        os.unlink(tmp_name)
+
+
+def delete_stored(path: str | Path) -> bool:
+    """
+    Removes a stored file. Returns False if it was already gone.
+    """
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def set_aside(path: str | Path) -> Path | None:
+    """
+    Moves a stored file to a temporary name before it is deleted, so that it can
+    still be put back (`put_back`) if it turns out to be needed. Left-over files
+    are cleaned up like interrupted uploads. Returns None if the file was already gone.
+    """
+    aside = _partial_path()
+    try:
+        os.replace(path, aside)
+    except FileNotFoundError:
+        return None
+    os.utime(aside)  # The partial-upload cleanup goes by age
+    return aside
+
+
+def put_back(aside: str | Path, path: str | Path) -> None:
+    """
+    Returns a file moved by `set_aside` to its stored path. Paths are content-addressed,
+    so replacing a copy stored there again in the meantime loses nothing.
+    """
+    os.replace(aside, path)
+
+
+def remove_partial_uploads(max_age_seconds: float) -> int:
+    """
+    Deletes temporary files left behind by uploads interrupted more than `max_age_seconds` ago.
+    """
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for path in UPLOADS_DIR.glob(f".*{PARTIAL_SUFFIX}"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,195 @@
+import os
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+import anyio
+import anyio.to_thread
+from dotenv import load_dotenv
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.crud import (
+    create_receipt_file,
+    get_receipt_file_by_hash,
+    get_receipt_id_for_file,
+    restore_receipt_file,
+    update_validation_status,
+)
+from app.models import ReceiptFile
+from app.services import ocr_service
+from app.services.job_queue import QueueFullError
+from app.services.pipeline import AlreadyQueuedError, submit_processing
+from app.services.storage import AsyncReadable, StoredFile, save_upload, save_upload_async
+from utils.logging import log
+
+logger = log(__name__)
+load_dotenv()
+
+# ----------------------------------------
+# Batch Upload Limits
+# ----------------------------------------
+
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+BATCH_MAX_UNCOMPRESSED_BYTES = int(os.getenv("BATCH_MAX_UNCOMPRESSED_BYTES", str(2 * 1024 ** 3)))
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+
+def store_upload(db: Session, source: BinaryIO, file_name: str) -> tuple[ReceiptFile, bool]:
+    """
+    Saves an uploaded PDF under its SHA-256 and registers it.
+
+    Returns:
+        tuple[ReceiptFile, bool]: The file record and whether it was a duplicate
+        of content that was already uploaded.
+    """
+    suffix = Path(file_name).suffix or ".pdf"
+    stored = save_upload(source, suffix=suffix)
+    db_file, is_duplicate = _register_upload(db, stored, file_name)
+    if not stored.path.exists():
+        # Deduplicated onto a copy that a concurrent retention run deleted: store it again
+        source.seek(0)
+        db_file = _restore_upload(db, db_file, save_upload(source, suffix=suffix))
+    return db_file, is_duplicate
+
+
+async def store_upload_async(db: AsyncSession, source: AsyncReadable, file_name: str) -> tuple[ReceiptFile, bool]:
+    """
+    Async counterpart of `store_upload` for the API routes: the file is written
+    without blocking the event loop and registered through the async session.
+    """
+    suffix = Path(file_name).suffix or ".pdf"
+    stored = await save_upload_async(source, suffix=suffix)
+    db_file, is_duplicate = await db.run_sync(_register_upload, stored, file_name)
+    if not await anyio.Path(stored.path).exists():
+        await source.seek(0)
+        db_file = await db.run_sync(_restore_upload, db_file, await save_upload_async(source, suffix=suffix))
+    return db_file, is_duplicate
+
+
+def _register_upload(db: Session, stored: StoredFile, file_name: str) -> tuple[ReceiptFile, bool]:
+    existing = get_receipt_file_by_hash(db, content_hash=stored.sha256)
+    if existing is None:
+        try:
+            db_file = create_receipt_file(
+                db, file_name=file_name, file_path=str(stored.path), content_hash=stored.sha256
+            )
+            logger.info(f"Uploaded file saved: {file_name} -> {stored.path}")
+            return db_file, False
+        except IntegrityError:
+            # A concurrent upload of the same content won the insert.
+            db.rollback()
+            existing = get_receipt_file_by_hash(db, content_hash=stored.sha256)
+
+    if existing.purged_at is not None:
+        # The retention job deleted the earlier copy; keep the one just stored.
+        existing = _restore_upload(db, existing, stored)
+
+    logger.info(f"Duplicate upload {file_name} resolved to file_id={existing.id}")
+    return existing, True
+
+
+def _restore_upload(db: Session, db_file: ReceiptFile, stored: StoredFile) -> ReceiptFile:
+    restore_receipt_file(db, file_id=db_file.id, file_path=str(stored.path))
+    db.refresh(db_file)
+    return db_file
+
+
+def _iter_pdfs(file_name: str, content_type: str | None, source: BinaryIO) -> Iterator[tuple[str, BinaryIO | None]]:
+    """
+    Yields (name, stream) for a PDF upload or for each PDF inside a ZIP upload.
+    Entries that cannot be ingested are yielded with a None stream.
+    """
+    if content_type not in ZIP_CONTENT_TYPES and not file_name.lower().endswith(".zip"):
+        yield file_name, source if content_type == "application/pdf" else None
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        entries = [info for info in archive.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in entries) > BATCH_MAX_UNCOMPRESSED_BYTES:
+            raise ValueError(f"{file_name}: archive is larger than {BATCH_MAX_UNCOMPRESSED_BYTES} bytes uncompressed")
+        for info in entries:
+            name = f"{file_name}/{info.filename}"
+            if not info.filename.lower().endswith(".pdf"):
+                yield name, None
+                continue
+            with archive.open(info) as entry:
+                yield name, entry
+
+
+def ingest_batch(db: Session, uploads: list[tuple[str, str | None, BinaryIO]], process: bool = False) -> list[dict[str, Any]]:
+    """
+    Stores, validates and (optionally) queues every PDF in `uploads`,
+    which holds (file name, content type, stream) tuples of PDFs or ZIP archives.
+
+    Returns one result dict per PDF (or rejected entry), in upload order.
+    """
+    results: list[dict[str, Any]] = []
+    for file_name, content_type, source in uploads:
+        try:
+            for name, stream in _iter_pdfs(file_name, content_type, source):
+                if len(results) >= BATCH_MAX_FILES:
+                    raise ValueError(f"Batch is limited to {BATCH_MAX_FILES} files")
+                if stream is None:
+                    results.append({"file_name": name, "status": "rejected", "message": "Only PDFs are accepted."})
+                    continue
+                results.append(_ingest_one(db, name, stream, process))
+        except (ValueError, zipfile.BadZipFile) as e:
+            results.append({"file_name": file_name, "status": "rejected", "message": str(e)})
+    return results
+
+
+async def ingest_batch_async(uploads: list[tuple[str, str | None, BinaryIO]], process: bool = False) -> list[dict[str, Any]]:
+    """
+    Runs `ingest_batch` on a worker thread with its own session. ZIP extraction,
+    hashing and validation of a whole batch are blocking work, so they are kept
+    off the event loop in one hop rather than one per file.
+    """
+    def run() -> list[dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            return ingest_batch(db, uploads, process=process)
+        finally:
+            db.close()
+
+    return await anyio.to_thread.run_sync(run)
+
+
+def _ingest_one(db: Session, file_name: str, stream: BinaryIO, process: bool) -> dict[str, Any]:
+    try:
+        db_file, is_duplicate = store_upload(db, stream, file_name)
+    except (OSError, EOFError, zipfile.BadZipFile, zlib.error) as e:
+        # Disk full, or a corrupt ZIP entry: only this file fails, not the batch
+        logger.error(f"Failed to store {file_name}: {e}")
+        return {"file_name": file_name, "status": "rejected", "message": f"Could not store file: {e}"}
+    result = {
+        "file_name": file_name,
+        "id": db_file.id,
+        "content_hash": db_file.content_hash,
+        "is_duplicate": is_duplicate,
+        "receipt_id": get_receipt_id_for_file(db, file_id=db_file.id) if is_duplicate else None,
+        "status": "duplicate" if is_duplicate else "uploaded",
+    }
+
+    # Validate inline, unless a previous upload of the same content already did
+    if db_file.is_valid is None:
+        is_valid, reason = ocr_service.validate_pdf(db_file.file_path)
+        db_file = update_validation_status(db, file_id=db_file.id, is_valid=is_valid, reason=reason)
+    result["is_valid"] = db_file.is_valid
+    if not db_file.is_valid:
+        result["status"] = "invalid"
+        result["message"] = db_file.invalid_reason
+        return result
+
+    if process and not db_file.is_processed:
+        try:
+            job = submit_processing(db, file_id=db_file.id)
+            result["status"] = "queued"
+            result["job_id"] = job.id
+        except (AlreadyQueuedError, QueueFullError) as e:
+            result["message"] = str(e)
+    return result
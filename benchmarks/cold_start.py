@@ -0,0 +1,70 @@
+"""
+Measures API cold start in fresh interpreters: importing `app.main`, running
+startup (lifespan) and serving a first `GET /receipts`, against a throwaway
+SQLite database. Also reports which heavy optional stacks were imported by then.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs in the child process; prints one JSON line of timings.
+CHILD = """
+import json, sys, time
+from fastapi.testclient import TestClient  # Test harness only; imported before timing starts
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+with TestClient(app.main.app) as client:
+    ready = time.perf_counter()
+    client.get("/receipts")
+    served = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "startup": ready - imported,
+    "first_request": served - ready,
+    "total": served - started,
+    "modules": [m for m in ("openai", "PyPDF2", "pdf2image") if m in sys.modules],
+}))
+"""
+
+STAGES = ("import", "startup", "first_request", "total")
+
+
+def run_once(workdir: str) -> dict:
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'cold.db')}",
+        UPLOADS_DIR=os.path.join(workdir, "uploads"),
+        PYTHONPATH=os.getcwd(),
+    )
+    env.setdefault("OPENAI_API_KEY", "benchmark")  # Older trees refuse to import without one
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=workdir, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        run_once(workdir)  # Warm-up: creates the database and fills the OS file cache
+        results = [run_once(workdir) for _ in range(args.runs)]
+
+    print(f"median of {args.runs} run(s)")
+    for stage in STAGES:
+        print(f"{stage:14} {statistics.median(r[stage] for r in results) * 1000:8.1f} ms")
+    print(f"heavy modules loaded: {', '.join(results[-1]['modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
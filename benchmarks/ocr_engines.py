@@ -0,0 +1,63 @@
+"""
+Compares OCR page throughput of the available engines on a sample PDF.
+
+Usage:
+    python -m benchmarks.ocr_engines path/to/receipt.pdf [--repeat 3] [--dpi 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pdf2image import convert_from_path
+
+from app.services.ocr_worker import PytesseractEngine, TesserocrEngine
+
+
+def benchmark(engine, image_paths: list[str], repeat: int) -> float:
+    """
+    Returns pages per second for `engine` over `image_paths`, after one warm-up page.
+    """
+    engine.image_to_string(image_paths[0])
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in image_paths:
+            engine.image_to_string(path)
+    return (len(image_paths) * repeat) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--lang", default="eng")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        image_paths = sorted(convert_from_path(
+            args.pdf,
+            dpi=args.dpi,
+            grayscale=True,
+            output_folder=output_folder,
+            paths_only=True,
+            poppler_path=os.getenv("POPPLER_PATH"),
+        ))
+        print(f"{len(image_paths)} page(s) at {args.dpi} dpi, {args.repeat} repeat(s)")
+
+        results = {}
+        for engine_cls in (PytesseractEngine, TesserocrEngine):
+            try:
+                engine = engine_cls(lang=args.lang)
+            except Exception as e:
+                print(f"{engine_cls.name:12} unavailable: {e}")
+                continue
+            results[engine_cls.name] = benchmark(engine, image_paths, args.repeat)
+            print(f"{engine_cls.name:12} {results[engine_cls.name]:8.2f} pages/s")
+
+        if len(results) == 2:
+            print(f"tesserocr speed-up: {results['tesserocr'] / results['pytesseract']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
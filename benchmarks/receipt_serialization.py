@@ -0,0 +1,110 @@
+"""
+Compares the cost of building a `GET /receipts` response through the ORM + Pydantic
+path (what FastAPI does with `response_model`) and the Core select + orjson path,
+on a throwaway SQLite database. Also checks that both produce byte-identical JSON.
+
+Usage:
+    python -m benchmarks.receipt_serialization [--receipts 5000] [--items 5] [--limit 1000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.crud import get_all_receipts, get_receipt_rows
+from app.models import Base, Receipt, ReceiptFile, ReceiptItem
+from app.schemas import receipt
+
+
+def populate(session: Session, receipts: int, items: int) -> None:
+    session.execute(insert(ReceiptFile), [
+        {"id": i, "file_name": f"{i}.pdf", "file_path": f"uploads/{i}.pdf", "is_valid": True, "is_processed": True}
+        for i in range(1, receipts + 1)
+    ])
+    start = datetime(2024, 1, 1)
+    session.execute(insert(Receipt), [
+        {
+            "id": i,
+            "receipt_file_id": i,
+            "merchant_name": random.choice(["Staples", "Office Depot", "Café Müller", None]),
+            "purchased_at": start + timedelta(hours=i),
+            "total_amount": round(random.uniform(1, 500), 2),
+        }
+        for i in range(1, receipts + 1)
+    ])
+    session.execute(insert(ReceiptItem), [
+        {
+            "receipt_id": i,
+            "description": f"Item {n} of receipt {i}",
+            "quantity": float(random.randint(1, 5)),
+            "price": round(random.uniform(0.5, 100), 2),
+        }
+        for i in range(1, receipts + 1)
+        for n in range(items)
+    ])
+    session.commit()
+
+
+def orm_pydantic(session: Session, limit: int) -> bytes:
+    adapter = TypeAdapter(List[receipt.Receipt])
+    receipts = get_all_receipts(session, limit=limit)
+    validated = adapter.validate_python(receipts, from_attributes=True)
+    # Rendered the way Starlette's JSONResponse does
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def core_orjson(session: Session, limit: int) -> bytes:
+    rows, _ = get_receipt_rows(session, limit=limit)
+    return orjson.dumps(rows)
+
+
+def benchmark(session: Session, build: Callable[[Session, int], bytes], limit: int, repeat: int) -> float:
+    """
+    Returns milliseconds per response, after one warm-up run.
+    """
+    build(session, limit)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        session.expunge_all()
+        build(session, limit)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            populate(session, args.receipts, args.items)
+
+            if orm_pydantic(session, args.limit) != core_orjson(session, args.limit):
+                raise SystemExit("Responses differ between the two paths.")
+
+            print(f"{args.limit} receipt(s) x {args.items} item(s) per response, {args.repeat} repeat(s)")
+            orm_ms = benchmark(session, orm_pydantic, args.limit, args.repeat)
+            print(f"{'orm+pydantic':14} {orm_ms:8.1f} ms/response")
+            core_ms = benchmark(session, core_orjson, args.limit, args.repeat)
+            print(f"{'core+orjson':14} {core_ms:8.1f} ms/response")
+            print(f"speed-up: {orm_ms / core_ms:.2f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
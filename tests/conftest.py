@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+import pytest
+
+# Point the app at a throwaway database before any app module reads the environment
+_tmpdir = tempfile.mkdtemp(prefix="receiptiq-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["UPLOADS_DIR"] = os.path.join(_tmpdir, "uploads")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete, text  # noqa: E402
+
+from app.core.database import SessionLocal, engine  # noqa: E402
+from app.core.migrations import init_database  # noqa: E402
+from app.models import Base, ReceiptFile  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_database(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(delete(table))
+        for table in ("receipt_search", "receipt_merchant_trigram"):  # Full-text index, not in the models
+            session.execute(text(f"DELETE FROM {table}"))
+        session.commit()
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    """
+    API client without the app's startup and shutdown, so no background workers run.
+    """
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_file(db):
+    """
+    Creates a receipt file row; validated, unprocessed files by default.
+    """
+    counter = iter(range(1, 1_000_000))
+
+    def make(**values) -> ReceiptFile:
+        n = next(counter)
+        values.setdefault("is_valid", True)
+        db_file = ReceiptFile(file_name=f"r{n}.pdf", file_path=f"uploads/r{n}.pdf", **values)
+        db.add(db_file)
+        db.commit()
+        return db_file
+
+    return make
@@ -0,0 +1,96 @@
+import errno
+import io
+import zipfile
+
+from PIL import Image
+
+from app.services import storage, upload_service
+
+
+def _pdf(shade: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("L", (50, 50), shade).save(buffer, format="PDF")
+    return buffer.getvalue()
+
+
+def _zip(entries: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _corrupt_entry(data: bytes, name: str) -> bytes:
+    """
+    Flips a byte in the stored data of one entry, so reading it fails its CRC check.
+    """
+    info = zipfile.ZipFile(io.BytesIO(data)).getinfo(name)
+    offset = info.header_offset + 30 + len(info.filename.encode()) + len(info.extra) + info.file_size // 2
+    return data[:offset] + bytes([data[offset] ^ 0xFF]) + data[offset + 1:]
+
+
+def _upload(client, *files: tuple[str, bytes, str]):
+    response = client.post("/upload/batch", files=[("files", file) for file in files])
+    assert response.status_code == 200
+    return [(result["file_name"], result["status"]) for result in response.json()["files"]]
+
+
+def test_pdfs_and_zip_entries_are_ingested_in_order(client, db):
+    archive = _zip({"a.pdf": _pdf(10), "notes.txt": b"hello", "dir/b.pdf": _pdf(20)})
+
+    results = _upload(
+        client,
+        ("one.pdf", _pdf(30), "application/pdf"),
+        ("receipts.zip", archive, "application/zip"),
+        ("again.pdf", _pdf(10), "application/pdf"),
+        ("bad.zip", b"not a zip", "application/zip"),
+    )
+
+    assert results == [
+        ("one.pdf", "uploaded"),
+        ("receipts.zip/a.pdf", "uploaded"),
+        ("receipts.zip/notes.txt", "rejected"),
+        ("receipts.zip/dir/b.pdf", "uploaded"),
+        ("again.pdf", "duplicate"),
+        ("bad.zip", "rejected"),
+    ]
+
+
+def test_corrupt_zip_entry_only_rejects_that_entry(client, db):
+    archive = _corrupt_entry(_zip({"a.pdf": _pdf(40), "b.pdf": _pdf(50)}), "a.pdf")
+
+    assert _upload(client, ("receipts.zip", archive, "application/zip")) == [
+        ("receipts.zip/a.pdf", "rejected"),
+        ("receipts.zip/b.pdf", "uploaded"),
+    ]
+
+
+def test_storage_error_only_rejects_that_file(client, db, monkeypatch):
+    save_upload = storage.save_upload
+
+    def disk_full_for_first(source, suffix):
+        monkeypatch.setattr(upload_service, "save_upload", save_upload)
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(upload_service, "save_upload", disk_full_for_first)
+
+    response = client.post("/upload/batch", files=[
+        ("files", ("a.pdf", _pdf(60), "application/pdf")),
+        ("files", ("b.pdf", _pdf(70), "application/pdf")),
+    ])
+
+    first, second = response.json()["files"]
+    assert first["status"] == "rejected" and "No space left" in first["message"]
+    assert second["status"] == "uploaded" and second["is_valid"] is True
+
+
+def test_batch_is_limited_to_max_files(client, db, monkeypatch):
+    monkeypatch.setattr(upload_service, "BATCH_MAX_FILES", 2)
+    archive = _zip({f"{n}.pdf": _pdf(80 + n) for n in range(3)})
+
+    assert _upload(client, ("receipts.zip", archive, "application/zip")) == [
+        ("receipts.zip/0.pdf", "uploaded"),
+        ("receipts.zip/1.pdf", "uploaded"),
+        ("receipts.zip", "rejected"),
+    ]
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import os
+
+from app.api.responses import PATHSEND, PathSendFileResponse
+from app.main import RequestLatencyMiddleware
+from app.services.upload_service import store_upload
+
+PDF = b"%PDF-1.4\ndownload\n%%EOF"
+
+
+def _scope(extensions: dict, headers: list[tuple[bytes, bytes]] | None = None) -> dict:
+    return {
+        "type": "http", "method": "GET", "path": "/", "headers": headers or [], "extensions": extensions,
+    }
+
+
+def _call(app, scope: dict) -> list[dict]:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def test_download_returns_original_bytes(client, db):
+    db_file, _ = store_upload(db, io.BytesIO(PDF), "r.pdf")
+
+    response = client.get(f"/files/{db_file.id}/download")
+
+    assert response.status_code == 200
+    assert response.content == PDF
+
+
+def test_file_is_handed_to_server_with_pathsend(tmp_path):
+    path = tmp_path / "r.pdf"
+    path.write_bytes(PDF)
+    app = RequestLatencyMiddleware(PathSendFileResponse(str(path), media_type="application/pdf"))
+
+    start, pathsend = _call(app, _scope({PATHSEND: {}}))
+
+    assert start["type"] == "http.response.start" and start["status"] == 200
+    assert (b"content-length", str(len(PDF)).encode()) in start["headers"]
+    assert pathsend == {"type": PATHSEND, "path": os.path.abspath(path)}
+
+
+def test_file_is_streamed_without_pathsend_or_for_ranges(tmp_path):
+    path = tmp_path / "r.pdf"
+    path.write_bytes(PDF)
+
+    messages = _call(PathSendFileResponse(str(path)), _scope({}))
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == PDF
+
+    messages = _call(PathSendFileResponse(str(path)), _scope({PATHSEND: {}}, [(b"range", b"bytes=0-3")]))
+    assert messages[0]["status"] == 206
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == PDF[:4]
@@ -0,0 +1,166 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.cli import ingest
+from app.models import Receipt, ReceiptFile
+from app.services.storage import save_upload
+
+
+class InlinePool:
+    """
+    Stands in for the process pool: runs `_process_path` in the test process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def imap_unordered(self, fn, items):
+        return map(fn, items)
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """
+    Replaces OCR and extraction with a fake that reads the merchant from the file,
+    and records the sources it was called for.
+    """
+    calls: list[str] = []
+    failing: set[str] = set()
+
+    def process_path(source: str):
+        calls.append(source)
+        if source in failing:
+            return {"source": source, "file_name": Path(source).name, "pages": 0, "status": "failed", "error": "boom"}
+        with open(source, "rb") as f:
+            stored = save_upload(f, suffix=".pdf")
+        merchant = Path(source).stem
+        return {
+            "source": source,
+            "file_name": Path(source).name,
+            "pages": 1,
+            "file_path": str(stored.path),
+            "sha256": stored.sha256,
+            "is_valid": True,
+            "reason": "File is a valid PDF.",
+            "status": "extracted",
+            "extracted_data": {"merchant_name": merchant, "purchased_at": None, "total_amount": 1, "items": []},
+            "page_records": [
+                {"page": 1, "text": merchant, "error": None, "source": "ocr", "engine": "fake", "duration_ms": 1.0}
+            ],
+            "ocr_text": None,
+        }
+
+    monkeypatch.setattr(ingest, "_process_path", process_path)
+    monkeypatch.setattr(ingest, "multiprocessing", SimpleNamespace(get_context=lambda method: SimpleNamespace(Pool=InlinePool)))
+    return SimpleNamespace(calls=calls, failing=failing)
+
+
+@pytest.fixture
+def sources(tmp_path) -> list[str]:
+    paths = []
+    for n in range(5):
+        path = tmp_path / f"merchant{n}.pdf"
+        path.write_bytes(b"%PDF-1.4\n" + str(n).encode() + b"\n%%EOF")
+        paths.append(str(path))
+    return paths
+
+
+def _run(sources: list[str], checkpoint: Path, batch_size: int = 2):
+    return ingest.run(sources, checkpoint, workers=1, batch_size=batch_size)
+
+
+def _merchants(db) -> list[str]:
+    db.expire_all()
+    return sorted(name for (name,) in db.query(Receipt.merchant_name))
+
+
+def test_run_ingests_every_file_and_checkpoints_it(db, processed, sources, tmp_path):
+    checkpoint = tmp_path / "run.checkpoint"
+
+    totals = _run(sources, checkpoint)
+
+    assert totals["processed"] == 5
+    assert _merchants(db) == [f"merchant{n}" for n in range(5)]
+    assert checkpoint.read_text().splitlines() == sources
+
+    # A second run finds everything in the checkpoint and does no work
+    processed.calls.clear()
+    assert _run(sources, checkpoint)["processed"] == 0
+    assert processed.calls == []
+
+
+def test_interrupted_run_resumes_after_last_committed_batch(db, processed, sources, tmp_path, monkeypatch):
+    checkpoint = tmp_path / "run.checkpoint"
+    write_batch = ingest._write_batch
+    batches = []
+
+    def interrupted_after_two_batches(results):
+        if len(batches) == 2:
+            raise KeyboardInterrupt
+        batches.append(len(results))
+        write_batch(results)
+
+    monkeypatch.setattr(ingest, "_write_batch", interrupted_after_two_batches)
+    with pytest.raises(KeyboardInterrupt):
+        _run(sources, checkpoint)
+    assert checkpoint.read_text().splitlines() == sources[:4]
+
+    monkeypatch.setattr(ingest, "_write_batch", write_batch)
+    processed.calls.clear()
+    assert _run(sources, checkpoint)["processed"] == 1
+
+    assert processed.calls == sources[4:]
+    assert _merchants(db) == [f"merchant{n}" for n in range(5)]
+
+
+def test_failed_files_are_not_checkpointed_and_are_retried(db, processed, sources, tmp_path):
+    checkpoint = tmp_path / "run.checkpoint"
+    processed.failing.add(sources[1])
+
+    totals = _run(sources, checkpoint)
+    assert (totals["processed"], totals["failed"]) == (4, 1)
+    assert sources[1] not in checkpoint.read_text().splitlines()
+
+    processed.failing.clear()
+    processed.calls.clear()
+    assert _run(sources, checkpoint)["processed"] == 1
+    assert processed.calls == [sources[1]]
+
+
+def test_bad_record_does_not_sink_its_batch(db, processed, sources, tmp_path, monkeypatch):
+    process_path = ingest._process_path
+
+    def bad_total_for_second(source):
+        result = process_path(source)
+        if source == sources[1]:
+            result["extracted_data"]["total_amount"] = "not a number"
+        return result
+
+    monkeypatch.setattr(ingest, "_process_path", bad_total_for_second)
+
+    totals = _run(sources, tmp_path / "run.checkpoint", batch_size=5)
+
+    assert (totals["processed"], totals["failed"]) == (4, 1)
+    assert _merchants(db) == ["merchant0", "merchant2", "merchant3", "merchant4"]
+    assert db.query(ReceiptFile).count() == 4
+
+
+def test_identical_files_are_ingested_once(db, processed, tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.pdf"
+        path.write_bytes(b"%PDF-1.4\nsame\n%%EOF")
+        paths.append(str(path))
+
+    totals = _run(paths, tmp_path / "run.checkpoint")
+
+    assert (totals["processed"], totals["duplicate"]) == (1, 1)
+    assert db.query(ReceiptFile).count() == 1
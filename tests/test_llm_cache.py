@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.api import routes
+from app.models import LLMCacheEntry
+from app.services import llm_cache as llm_cache_module
+from app.services.llm_cache import LLMCache
+
+VALUE = {"merchant_name": "Staples", "total_amount": 12.5}
+
+
+@pytest.fixture
+def cache(db):
+    return LLMCache(max_entries=10, touch_batch=3, touch_interval=3600)
+
+
+def _entry(db, key: str) -> LLMCacheEntry:
+    db.expire_all()
+    return db.get(LLMCacheEntry, key)
+
+
+def test_key_ignores_ocr_whitespace_but_not_model_or_prompt():
+    key = LLMCache.make_key("STAPLES  \r\n\n\n TOTAL 12.50 ", "gpt", "1")
+
+    assert key == LLMCache.make_key("STAPLES\nTOTAL 12.50", "gpt", "1")
+    assert key != LLMCache.make_key("STAPLES\nTOTAL 12.50", "gpt", "2")
+    assert key != LLMCache.make_key("STAPLES\nTOTAL 12.50", "other", "1")
+
+
+def test_round_trip_and_miss(cache):
+    assert cache.get("a") is None
+    cache.set("a", "gpt", "1", VALUE)
+
+    assert cache.get("a") == VALUE
+
+
+def test_hits_are_written_in_batches(db, cache):
+    cache.set("a", "gpt", "1", VALUE)
+    db.execute(update(LLMCacheEntry).values(last_used_at=datetime(2024, 1, 1)))
+    db.commit()
+
+    cache.get("a")
+    cache.get("a")
+    assert _entry(db, "a").hit_count == 0
+
+    cache.get("a")  # Third pending hit: the batch is written
+    entry = _entry(db, "a")
+    assert entry.hit_count == 3
+    assert entry.last_used_at.year > 2024
+
+    cache.get("a")
+    cache.flush()
+    assert _entry(db, "a").hit_count == 4
+
+
+def test_eviction_keeps_recently_used_entries(db, cache):
+    for n in range(10):
+        cache.set(str(n), "gpt", "1", VALUE)
+    db.execute(update(LLMCacheEntry).values(last_used_at=datetime(2024, 1, 1)))
+    db.commit()
+    for _ in range(3):
+        cache.get("0")  # Flushed as a batch: "0" is now the most recently used entry
+
+    cache.set("10", "gpt", "1", VALUE)
+
+    db.expire_all()
+    keys = {key for (key,) in db.query(LLMCacheEntry.key)}
+    assert len(keys) == 9
+    assert {"0", "10"} <= keys
+
+
+def test_table_is_only_counted_when_eviction_may_be_due(db, cache, monkeypatch):
+    counts = []
+    count, evict = llm_cache_module.count_llm_cache_entries, llm_cache_module.evict_llm_cache_entries
+
+    def counting(session):
+        counts.append("count")
+        return count(session)
+
+    def evicting(session, max_entries):
+        counts.append("evict")
+        return evict(session, max_entries)
+
+    monkeypatch.setattr(llm_cache_module, "count_llm_cache_entries", counting)
+    monkeypatch.setattr(llm_cache_module, "evict_llm_cache_entries", evicting)
+
+    for n in range(12):
+        cache.set(str(n), "gpt", "1", VALUE)
+
+    # Counted on the first write, then again only on the write after an eviction
+    assert counts == ["count", "evict", "count"]
+
+
+def test_stats_endpoint_reports_the_prometheus_hit_and_miss_counts(client, cache, monkeypatch):
+    monkeypatch.setattr(routes, "llm_cache", cache)
+    before = client.get("/llm/cache").json()
+    cache.set("a", "gpt", "1", VALUE)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+
+    stats = client.get("/llm/cache").json()
+    assert stats["enabled"] is True
+    assert (stats["entries"], stats["max_entries"]) == (1, 10)
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["misses"] - before["misses"] == 1
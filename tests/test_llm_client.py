@@ -0,0 +1,132 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.services import llm_service
+from app.services.llm_service import LLMService
+from app.services.rate_limiter import TokenBucket
+
+
+def _rate_limited(retry_after: float) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://llm.test/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after": str(retry_after)})
+    return openai.RateLimitError("Rate limited", response=response, body=None)
+
+
+def _completion(content: str):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeCompletions:
+    """
+    Answers with `content`, after raising the queued errors for the prompts that have them.
+    """
+
+    def __init__(self, errors: dict[str, list[Exception]] | None = None):
+        self.errors = errors or {}
+        self.calls: list[str] = []
+
+    async def create(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.calls.append(prompt)
+        if self.errors.get(prompt):
+            raise self.errors[prompt].pop(0)
+        await asyncio.sleep(0.01)
+        return _completion('{"merchant_name": "%s"}' % prompt)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_BACKOFF_BASE", 0.0)
+    service = LLMService(api_key="test")
+    completions = FakeCompletions()
+
+    async def close():
+        pass
+
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions), close=close)
+    yield service, completions
+    service.close()
+
+
+def _run(coroutine_function):
+    return asyncio.run(coroutine_function())
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(2, period=0.2)  # 10 tokens per second
+
+    async def take_three():
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire(1)
+        return time.monotonic() - started
+
+    assert 0.08 <= _run(take_three) < 0.5
+
+
+def test_token_bucket_refunds_overestimates_and_caps_large_requests():
+    bucket = TokenBucket(100, period=60)
+
+    async def take():
+        await bucket.acquire(100)
+        bucket.adjust(-40)  # Used 60 of the 100 estimated
+        started = time.monotonic()
+        await bucket.acquire(40)
+        await TokenBucket(10, period=0.1).acquire(1000)  # Capped at the bucket size
+        return time.monotonic() - started
+
+    assert _run(take) < 0.1
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(0)
+
+    async def take():
+        for _ in range(1000):
+            await bucket.acquire(10 ** 6)
+
+    _run(take)
+
+
+def test_backoff_honours_retry_after_and_cap(monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(llm_service, "LLM_BACKOFF_MAX", 4.0)
+
+    assert all(0 <= LLMService._backoff_delay(10, RuntimeError()) <= 4.0 for _ in range(100))
+    assert LLMService._backoff_delay(0, _rate_limited(7)) >= 7
+
+
+def test_rate_limited_call_is_retried(llm):
+    service, completions = llm
+    completions.errors["a"] = [_rate_limited(0), _rate_limited(0)]
+
+    assert service._runner.run(service._complete("a")) == '{"merchant_name": "a"}'
+    assert completions.calls == ["a", "a", "a"]
+
+
+def test_client_errors_are_not_retried(llm):
+    service, completions = llm
+    request = httpx.Request("POST", "https://llm.test/v1/chat/completions")
+    completions.errors["a"] = [openai.BadRequestError("Bad", response=httpx.Response(400, request=request), body=None)]
+
+    with pytest.raises(openai.BadRequestError):
+        service._runner.run(service._complete("a"))
+    assert completions.calls == ["a"]
+
+
+def test_concurrency_slot_is_released_while_backing_off(llm, monkeypatch):
+    service, completions = llm
+    service._semaphore = asyncio.Semaphore(1)
+    completions.errors["slow"] = [_rate_limited(0.3)]
+
+    async def both():
+        return await asyncio.gather(service._complete("slow"), service._complete("other"))
+
+    assert service._runner.run(both()) == ['{"merchant_name": "slow"}', '{"merchant_name": "other"}']
+    # "other" ran while "slow" waited out its Retry-After
+    assert completions.calls == ["slow", "other", "slow"]
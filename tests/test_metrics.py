@@ -0,0 +1,56 @@
+import pytest
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+
+from app.core.metrics import time_stage
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _requests(method: str, route: str, status: str) -> float:
+    return _sample("receiptiq_http_request_duration_seconds_count", method=method, route=route, status=status)
+
+
+def test_metrics_endpoint_serves_prometheus_text(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE_LATEST
+    for name in (
+        "receiptiq_stage_duration_seconds",
+        "receiptiq_failures_total",
+        "receiptiq_http_request_duration_seconds",
+    ):
+        assert f"# HELP {name} " in response.text
+
+
+def test_request_latency_is_labelled_by_route_template(client):
+    before = _requests("GET", "/receipts/{receipt_id}", "404")
+    unmatched = _requests("GET", "unmatched", "404")
+
+    for receipt_id in (987654, 987655):
+        assert client.get(f"/receipts/{receipt_id}").status_code == 404
+    client.get("/no/such/path")
+
+    assert _requests("GET", "/receipts/{receipt_id}", "404") == before + 2
+    assert _requests("GET", "unmatched", "404") == unmatched + 1
+    assert 'route="/receipts/987654"' not in client.get("/metrics").text
+
+
+def test_stage_is_timed_even_when_it_raises():
+    before = _sample("receiptiq_stage_duration_seconds_count", stage="test_stage")
+
+    with pytest.raises(RuntimeError):
+        with time_stage("test_stage"):
+            raise RuntimeError
+
+    assert _sample("receiptiq_stage_duration_seconds_count", stage="test_stage") == before + 1
+
+
+def test_commits_are_timed(client, make_file):
+    before = _sample("receiptiq_stage_duration_seconds_count", stage="db_commit")
+
+    make_file()
+
+    assert _sample("receiptiq_stage_duration_seconds_count", stage="db_commit") == before + 1
@@ -0,0 +1,30 @@
+import sys
+
+import pytest
+
+from app.services.ocr_worker import PytesseractEngine, create_engine
+
+
+@pytest.fixture
+def no_tesserocr(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tesserocr", None)  # Makes `import tesserocr` fail
+
+
+@pytest.mark.parametrize("name", ["auto", "tesserocr"])
+def test_missing_tesserocr_falls_back_with_warning(no_tesserocr, caplog, name):
+    engine = create_engine(name)
+
+    assert isinstance(engine, PytesseractEngine)
+    assert "falls back to pytesseract" in caplog.text
+
+
+def test_unknown_engine_falls_back_with_warning(caplog):
+    engine = create_engine("tesseract-ng")
+
+    assert isinstance(engine, PytesseractEngine)
+    assert "Unknown OCR_ENGINE 'tesseract-ng'" in caplog.text
+
+
+def test_pytesseract_is_used_without_warning(caplog):
+    assert isinstance(create_engine("pytesseract"), PytesseractEngine)
+    assert caplog.text == ""
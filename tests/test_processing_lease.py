@@ -0,0 +1,170 @@
+import threading
+
+import pytest
+from sqlalchemy import update
+
+from app.core.database import SessionLocal
+from app.crud import (
+    claim_receipt_file,
+    create_receipt_and_items,
+    enqueue_receipt_file,
+    get_receipt_file,
+    get_stale_receipt_file_ids,
+    release_queued_leases,
+    renew_lease,
+    renew_queued_leases,
+    requeue_stale_receipt_file,
+    save_receipt_pages,
+)
+from app.models import ProcessingStatus, Receipt, ReceiptFile, ReceiptPage
+from app.services import ocr_service, pipeline
+
+EXTRACTED = {"merchant_name": "Staples", "purchased_at": "2024-02-03", "total_amount": "12.5", "items": []}
+PAGES = [{"page": 1, "text": "STAPLES 12.50", "error": None, "source": "ocr", "engine": "tesseract", "duration_ms": 1.0}]
+
+
+def _claim_concurrently(file_id: int, owners: list[str], **kwargs) -> dict[str, bool]:
+    barrier = threading.Barrier(len(owners))
+    results: dict[str, bool] = {}
+
+    def claim(owner: str) -> None:
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            results[owner] = claim_receipt_file(session, file_id=file_id, lease_owner=owner, **kwargs)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim, args=(owner,)) for owner in owners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_only_one_concurrent_claim_wins(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id)
+
+    owners = [f"worker-{i}" for i in range(8)]
+    results = _claim_concurrently(db_file.id, owners, lease_seconds=60, max_attempts=3)
+
+    winners = [owner for owner, won in results.items() if won]
+    assert len(winners) == 1
+    db.expire_all()
+    db_file = get_receipt_file(db, db_file.id)
+    assert db_file.status == ProcessingStatus.RUNNING.value
+    assert db_file.lease_owner == winners[0]
+    assert db_file.attempts == 1
+
+
+def test_enqueue_refuses_file_under_live_lease(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id)
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="a", lease_seconds=60, max_attempts=3)
+
+    assert not enqueue_receipt_file(db, file_id=db_file.id)
+    assert not claim_receipt_file(db, file_id=db_file.id, lease_owner="b", lease_seconds=60, max_attempts=3)
+
+
+def test_stale_owner_is_fenced_after_lease_is_taken_over(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id)
+    # Lease already expired: the worker is presumed dead and another may take over
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="stale", lease_seconds=-1, max_attempts=3)
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="current", lease_seconds=60, max_attempts=3)
+
+    assert not renew_lease(db, file_id=db_file.id, lease_owner="stale", lease_seconds=60)
+    with pytest.raises(ValueError):
+        create_receipt_and_items(db, extracted_data=EXTRACTED, file_id=db_file.id, lease_owner="stale")
+    assert db.query(Receipt).count() == 0
+
+    assert renew_lease(db, file_id=db_file.id, lease_owner="current", lease_seconds=60)
+    receipt_id = create_receipt_and_items(db, extracted_data=EXTRACTED, file_id=db_file.id, lease_owner="current")
+    db.expire_all()
+    db_file = get_receipt_file(db, db_file.id)
+    assert db.query(Receipt).one().id == receipt_id
+    assert db_file.is_processed is True
+    assert db_file.status == ProcessingStatus.DONE.value
+    assert db_file.lease_owner is None
+    assert db_file.attempts == 2
+
+
+def test_stale_owner_cannot_overwrite_pages(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id)
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="stale", lease_seconds=-1, max_attempts=3)
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="current", lease_seconds=60, max_attempts=3)
+
+    with pytest.raises(ValueError):
+        save_receipt_pages(db, file_id=db_file.id, pages=PAGES, lease_owner="stale")
+    assert db.query(ReceiptPage).count() == 0
+
+    save_receipt_pages(db, file_id=db_file.id, pages=PAGES, lease_owner="current")
+    assert db.query(ReceiptPage).count() == 1
+
+
+def test_lease_is_renewed_after_every_ocr_window(db, make_file, monkeypatch):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id)
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="slow", lease_seconds=-1, max_attempts=3)
+
+    def extract_pages(path, on_window=None):
+        on_window()  # Renews the lease that had already run out
+        assert not claim_receipt_file(db, file_id=db_file.id, lease_owner="other", lease_seconds=60, max_attempts=3)
+        # Taken over anyway (e.g. the worker stalled for longer than the lease)
+        db.execute(update(ReceiptFile).where(ReceiptFile.id == db_file.id).values(lease_owner="other"))
+        db.commit()
+        on_window()
+        pytest.fail("OCR continued after the lease was lost")
+
+    monkeypatch.setattr(ocr_service, "extract_pages", extract_pages)
+
+    with pytest.raises(pipeline.ProcessingError):
+        pipeline._run_pipeline(db, file_id=db_file.id, file_path=db_file.file_path, lease_owner="slow")
+    assert db.query(ReceiptPage).count() == 0
+
+
+def test_expired_lease_is_not_reclaimed_after_last_attempt(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id)
+    assert claim_receipt_file(db, file_id=db_file.id, lease_owner="a", lease_seconds=-1, max_attempts=1)
+
+    assert not claim_receipt_file(db, file_id=db_file.id, lease_owner="b", lease_seconds=60, max_attempts=1)
+
+
+def test_files_queued_by_live_process_are_not_recovered(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id, queue_owner="replica-a", lease_seconds=60)
+    assert renew_queued_leases(db, queue_owner="replica-a", lease_seconds=60) == 1
+
+    assert get_stale_receipt_file_ids(db) == []
+    assert not requeue_stale_receipt_file(db, file_id=db_file.id, queue_owner="replica-b", lease_seconds=60,
+                                          max_attempts=3)
+
+
+def test_abandoned_files_are_taken_over_once(db, make_file):
+    queued, running = make_file(), make_file()
+    assert enqueue_receipt_file(db, file_id=queued.id, queue_owner="dead", lease_seconds=-1)
+    assert enqueue_receipt_file(db, file_id=running.id)
+    assert claim_receipt_file(db, file_id=running.id, lease_owner="dead", lease_seconds=-1, max_attempts=3)
+
+    assert get_stale_receipt_file_ids(db) == [queued.id, running.id]
+    for file_id in (queued.id, running.id):
+        assert requeue_stale_receipt_file(db, file_id=file_id, queue_owner="b", lease_seconds=60, max_attempts=3)
+        assert not requeue_stale_receipt_file(db, file_id=file_id, queue_owner="c", lease_seconds=60, max_attempts=3)
+    assert get_stale_receipt_file_ids(db) == []
+    # The worker that abandoned the running file can no longer finish it
+    assert not renew_lease(db, file_id=running.id, lease_owner="dead", lease_seconds=60)
+
+
+def test_released_files_stay_queued_for_other_processes(db, make_file):
+    db_file = make_file()
+    assert enqueue_receipt_file(db, file_id=db_file.id, queue_owner="stopping", lease_seconds=60)
+
+    assert release_queued_leases(db, queue_owner="stopping") == 1
+
+    db.expire_all()
+    assert get_receipt_file(db, db_file.id).status == ProcessingStatus.QUEUED.value
+    assert get_stale_receipt_file_ids(db) == [db_file.id]
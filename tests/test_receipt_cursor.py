@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import Receipt
+
+SORTS = [prefix + name for name in ("created_at", "purchased_at", "total_amount") for prefix in ("", "-")]
+
+
+@pytest.fixture
+def receipts(db, make_file):
+    """
+    Receipts whose sort keys tie heavily: every row shares its `created_at` second,
+    amounts and purchase dates repeat, and some purchase dates are NULL.
+    """
+    db_file = make_file()
+    amounts = [10.0, 10.0, 5.0, 10.0, 5.0, 20.0, 10.0]
+    dates = [datetime(2024, 1, 1), None, datetime(2024, 1, 1), datetime(2024, 2, 1), None, datetime(2024, 1, 1), None]
+    for i, (amount, purchased_at) in enumerate(zip(amounts, dates)):
+        db.add(Receipt(
+            receipt_file_id=db_file.id,
+            merchant_name="Staples" if i % 2 else "Acme",
+            total_amount=amount,
+            purchased_at=purchased_at,
+        ))
+    db.commit()
+    return [row.id for row in db.query(Receipt.id)]
+
+
+def _paginate(client, limit: int, **params) -> list[int]:
+    ids: list[int] = []
+    cursor = None
+    while True:
+        response = client.get("/receipts", params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids.extend(receipt["id"] for receipt in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+
+@pytest.mark.parametrize("sort", SORTS)
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_cursor_pages_cover_ties_exactly_once(client, receipts, sort, limit):
+    expected = [receipt["id"] for receipt in client.get("/receipts", params={"sort": sort, "limit": 100}).json()]
+
+    ids = _paginate(client, limit, sort=sort)
+
+    assert ids == expected
+    assert sorted(ids) == sorted(receipts)
+
+
+def test_cursor_pages_with_filter(client, receipts):
+    params = {"sort": "-total_amount", "merchant": "Acme", "min_total": 10}
+    expected = client.get("/receipts", params={**params, "limit": 100}).json()
+
+    assert _paginate(client, 1, **params) == [receipt["id"] for receipt in expected]
+    assert expected and all(receipt["merchant_name"] == "Acme" for receipt in expected)
+
+
+def test_cursor_for_another_sort_is_rejected(client, receipts):
+    cursor = client.get("/receipts", params={"sort": "total_amount", "limit": 1}).headers["X-Next-Cursor"]
+
+    assert client.get("/receipts", params={"sort": "-total_amount", "cursor": cursor}).status_code == 400
+    assert client.get("/receipts", params={"cursor": "not-a-cursor"}).status_code == 400
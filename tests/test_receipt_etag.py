@@ -0,0 +1,102 @@
+import pytest
+
+from app.core.metrics import RECEIPT_CACHE_REQUESTS, counter_value
+from app.crud import claim_for_reextract, create_receipt_and_items, replace_receipt
+from app.services.receipt_cache import ReceiptResponseCache, receipt_cache
+
+RECEIPT = {
+    "merchant_name": "Staples",
+    "purchased_at": "2024-01-01",
+    "total_amount": 10,
+    "items": [{"description": "Copy paper", "quantity": 1, "price": 10}],
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """
+    Receipt IDs are reused once the tables are emptied, so cached responses must not outlive a test.
+    """
+    receipt_cache.invalidate(list(receipt_cache._entries))
+    yield
+    receipt_cache.invalidate(list(receipt_cache._entries))
+
+
+@pytest.fixture
+def receipt_id(db, make_file) -> int:
+    return create_receipt_and_items(db, extracted_data=RECEIPT, file_id=make_file().id)
+
+
+def test_response_carries_etag_and_matching_request_gets_304(client, receipt_id):
+    response = client.get(f"/receipts/{receipt_id}")
+    assert response.status_code == 200
+    assert response.json()["merchant_name"] == "Staples"
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        not_modified = client.get(f"/receipts/{receipt_id}", headers={"If-None-Match": if_none_match})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+
+    stale = client.get(f"/receipts/{receipt_id}", headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200
+    assert stale.content == response.content
+
+
+def test_repeated_lookups_are_served_from_cache(client, receipt_id):
+    hits = counter_value(RECEIPT_CACHE_REQUESTS, result="hit")
+
+    first = client.get(f"/receipts/{receipt_id}")
+    second = client.get(f"/receipts/{receipt_id}")
+
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert counter_value(RECEIPT_CACHE_REQUESTS, result="hit") == hits + 1
+
+
+def test_replacing_a_receipt_evicts_its_cached_response(client, db, make_file):
+    db_file = make_file()
+    old_id = create_receipt_and_items(db, extracted_data=RECEIPT, file_id=db_file.id)
+    etag = client.get(f"/receipts/{old_id}").headers["etag"]
+
+    assert claim_for_reextract(db, file_id=db_file.id, lease_owner="w", lease_seconds=60)
+    new_id = replace_receipt(db, extracted_data={**RECEIPT, "total_amount": 12}, file_id=db_file.id, lease_owner="w")
+
+    # The old ID may be reused by the new receipt; either way the old response must not be served
+    assert client.get(f"/receipts/{old_id}", headers={"If-None-Match": etag}).status_code in (200, 404)
+    replaced = client.get(f"/receipts/{new_id}", headers={"If-None-Match": etag})
+    assert replaced.status_code == 200
+    assert replaced.json()["total_amount"] == 12
+    assert replaced.headers["etag"] != etag
+
+
+def test_rolled_back_write_keeps_cached_response(client, db, receipt_id):
+    client.get(f"/receipts/{receipt_id}")
+    db.info["changed_receipt_ids"] = {receipt_id}
+    db.rollback()
+
+    assert receipt_cache.get(receipt_id) is not None
+
+
+def test_response_loaded_before_an_invalidation_is_not_cached():
+    cache = ReceiptResponseCache(max_entries=2, ttl=60)
+    version = cache.version()
+    cache.invalidate([1])
+
+    entry = cache.set(1, b"{}", version=version)
+
+    assert entry.etag
+    assert cache.get(1) is None
+
+
+def test_cache_is_bounded_lru():
+    cache = ReceiptResponseCache(max_entries=2, ttl=60)
+    for receipt_id in (1, 2):
+        cache.set(receipt_id, b"{}", version=cache.version())
+    cache.get(1)
+    cache.set(3, b"{}", version=cache.version())
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
@@ -0,0 +1,40 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.crud import create_receipt_and_items, iter_receipt_batches
+
+
+@pytest.fixture
+def receipts(db, make_file):
+    """
+    Seven receipts; every other one has two items.
+    """
+    ids = []
+    for i in range(7):
+        items = [{"description": f"item {n}", "quantity": 1, "price": 1.5} for n in range(2)] if i % 2 else []
+        data = {"merchant_name": "Acme", "purchased_at": "2024-01-01", "total_amount": 10 + i, "items": items}
+        ids.append(create_receipt_and_items(db, extracted_data=data, file_id=make_file().id))
+    return ids
+
+
+def test_export_batches_cover_every_receipt_once(db, receipts):
+    batches = list(iter_receipt_batches(db, include_items=True, batch_size=3))
+
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [row["id"] for batch in batches for row in batch] == receipts
+    assert [len(row["items"]) for batch in batches for row in batch] == [0, 2, 0, 2, 0, 2, 0]
+
+
+def test_export_endpoint_streams_ndjson_and_csv(client, receipts):
+    response = client.get("/receipts/export")
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == receipts
+
+    response = client.get("/receipts/export", params={"format": "csv", "include_items": "false"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == receipts
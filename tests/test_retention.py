@@ -0,0 +1,84 @@
+import io
+import os
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app.crud import get_receipt_file
+from app.models import ReceiptFile
+from app.services import retention, upload_service
+from app.services.upload_service import store_upload
+
+PDF = b"%PDF-1.4\nretention\n%%EOF"
+
+
+def _upload_expired_invalid_file(db) -> ReceiptFile:
+    db_file, _ = store_upload(db, io.BytesIO(PDF), "r.pdf")
+    db.execute(
+        update(ReceiptFile)
+        .where(ReceiptFile.id == db_file.id)
+        .values(is_valid=False, updated_at=datetime(2020, 1, 1))
+    )
+    db.commit()
+    return db_file
+
+
+def _run_retention():
+    return retention.run_retention(invalid_days=1, processed_days=0)
+
+
+def _reload(db, file_id: int) -> ReceiptFile:
+    db.expire_all()
+    return get_receipt_file(db, file_id=file_id)
+
+
+def test_expired_file_is_purged(db):
+    db_file = _upload_expired_invalid_file(db)
+    path = db_file.file_path
+
+    totals = _run_retention()
+
+    assert totals["purged"] == 1
+    assert _reload(db, db_file.id).purged_at is not None
+    assert not os.path.exists(path)
+
+
+def test_file_uploaded_again_while_being_purged_is_kept(db, monkeypatch):
+    db_file = _upload_expired_invalid_file(db)
+    set_aside = retention.set_aside
+
+    def set_aside_then_upload(path):
+        aside = set_aside(path)
+        store_upload(db, io.BytesIO(PDF), "again.pdf")  # Restores the record before the purge is confirmed
+        return aside
+
+    monkeypatch.setattr(retention, "set_aside", set_aside_then_upload)
+    totals = _run_retention()
+
+    db_file = _reload(db, db_file.id)
+    assert totals["restored"] == 1 and totals["purged"] == 0
+    assert db_file.purged_at is None
+    with open(db_file.file_path, "rb") as f:
+        assert f.read() == PDF
+
+
+def test_upload_deduplicated_onto_file_purged_before_restore_is_stored_again(db, monkeypatch):
+    db_file = _upload_expired_invalid_file(db)
+    save_upload = upload_service.save_upload
+    calls = []
+
+    def save_then_purge(source, suffix):
+        stored = save_upload(source, suffix=suffix)
+        if not calls:  # Deduplicated onto the existing copy, which retention then deletes
+            assert _run_retention()["purged"] == 1
+        calls.append(stored)
+        return stored
+
+    monkeypatch.setattr(upload_service, "save_upload", save_then_purge)
+    _, is_duplicate = store_upload(db, io.BytesIO(PDF), "again.pdf")
+
+    db_file = _reload(db, db_file.id)
+    assert is_duplicate and len(calls) == 2
+    assert db_file.purged_at is None
+    with open(db_file.file_path, "rb") as f:
+        assert f.read() == PDF
@@ -0,0 +1,52 @@
+import pytest
+
+from app.crud import create_receipt_and_items
+
+
+@pytest.fixture
+def receipts(db, make_file):
+    """
+    Three receipts by merchant name; Café Noir also has its OCR text indexed.
+    """
+    def add(merchant_name: str, items: list[str], ocr_text: str | None = None) -> int:
+        data = {
+            "merchant_name": merchant_name,
+            "purchased_at": "2024-01-01",
+            "total_amount": 10,
+            "items": [{"description": description, "quantity": 1, "price": 5} for description in items],
+        }
+        return create_receipt_and_items(db, extracted_data=data, file_id=make_file().id, ocr_text=ocr_text)
+
+    return {
+        "Staples": add("Staples", ["Blue toner cartridge", "Copy paper"]),
+        "Office Depot": add("Office Depot", ["Black toner", "Stapler"]),
+        "Café Noir": add("Café Noir", ["Espresso"], ocr_text="CAFE NOIR TABLE 7 SERVER ANNA"),
+    }
+
+
+def _search(client, q: str, **params) -> list[str]:
+    response = client.get("/receipts/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [receipt["merchant_name"] for receipt in response.json()]
+
+
+def test_every_word_must_match_as_a_prefix(client, receipts):
+    assert sorted(_search(client, "toner")) == ["Office Depot", "Staples"]
+    assert _search(client, "blue ton") == ["Staples"]
+    assert sorted(_search(client, "stapl")) == ["Office Depot", "Staples"]  # Merchant name or item
+    assert _search(client, "toner espresso") == []
+
+
+def test_diacritics_and_ocr_text_are_searchable(client, receipts):
+    assert _search(client, "cafe") == ["Café Noir"]
+    assert _search(client, "anna") == ["Café Noir"]
+
+
+def test_fuzzy_matches_misspelled_merchants(client, receipts):
+    assert _search(client, "Stapels") == []
+    assert _search(client, "Stapels", fuzzy="true") == ["Staples"]
+    assert _search(client, "ofice depo", fuzzy="true") == ["Office Depot"]
+
+
+def test_punctuation_only_query_matches_nothing(client, receipts):
+    assert _search(client, '"*)(') == []
@@ -0,0 +1,37 @@
+from datetime import date, datetime
+
+from sqlalchemy import update
+
+from app.crud import claim_for_reextract, create_receipt_and_items, replace_receipt
+from app.models import Receipt, SpendSummary
+
+UNDATED = {"merchant_name": "Staples", "purchased_at": None, "total_amount": "12.5", "items": []}
+
+
+def _summary(db) -> dict[date, tuple[int, float]]:
+    return {row.day: (row.receipt_count, row.total_amount) for row in db.query(SpendSummary)}
+
+
+def test_undated_receipt_is_bucketed_on_created_at(db, make_file):
+    db_file = make_file()
+    receipt_id = create_receipt_and_items(db, extracted_data=UNDATED, file_id=db_file.id)
+
+    created = db.get(Receipt, receipt_id).created_at
+    assert _summary(db) == {created.date(): (1, 12.5)}
+
+
+def test_replacing_undated_receipt_keeps_buckets_balanced(db, make_file):
+    db_file = make_file()
+    create_receipt_and_items(db, extracted_data=UNDATED, file_id=db_file.id)
+    # Recorded on an earlier day: its spend must be removed from that day, not today
+    db.execute(update(Receipt).values(created_at=datetime(2024, 3, 1, 12, 0)))
+    db.execute(update(SpendSummary).values(day=date(2024, 3, 1)))
+    db.commit()
+
+    assert claim_for_reextract(db, file_id=db_file.id, lease_owner="w", lease_seconds=60)
+    receipt_id = replace_receipt(db, extracted_data=UNDATED, file_id=db_file.id, lease_owner="w")
+
+    created = db.get(Receipt, receipt_id).created_at
+    summary = _summary(db)
+    assert summary.pop(date(2024, 3, 1)) == (0, 0.0)
+    assert summary == {created.date(): (1, 12.5)}